@@ -0,0 +1,122 @@
+"""
+Negotiated gzip and brotli compression for API responses.
+
+Works like Django's GZipMiddleware, adding brotli when the brotli package is
+installed, a COMPRESSION_MIN_SIZE threshold and a content type check so
+images and other binary responses are left alone. Streamed responses are
+compressed chunk by chunk.
+
+A view can set `response.compression_cache_key` (the property response
+cache does) to keep the compressed body in the cache, so hot responses are
+compressed once per encoding rather than on every hit. The stored body is
+keyed by a digest of the uncompressed one as well, so a different rendering
+under the same key, such as the browsable API, is never served.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml', 'text/')
+
+
+def get_accepted_encodings(header):
+    """
+    The content codings in an Accept-Encoding header with a non-zero quality.
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = get_accepted_encodings(header)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return compress_string(content)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == 'gzip':
+        yield from compress_sequence(chunks)
+        return
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for chunk in chunks:
+        # Flush every chunk so the client receives rows as they are produced
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not self.is_compressible(response):
+            return response
+        # It's not worth compressing short responses
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # The compressed size is unknown until the stream ends
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            content = self.get_compressed(response, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # The compressed body is a different representation, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def get_compressed(self, response, encoding):
+        key = getattr(response, 'compression_cache_key', None)
+        if key is None:
+            return compress(response.content, encoding)
+        key = f'compressed:{encoding}:{key}:{hashlib.md5(response.content).hexdigest()}'
+        content = cache.get(key)
+        if content is None:
+            content = compress(response.content, encoding)
+            cache.set(key, content, timeout=settings.COMPRESSION_CACHE_TIMEOUT)
+        return content
@@ -65,6 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -119,6 +120,13 @@ DATABASES = {
     }
 }
 
+# MySQL does not build partial indexes, so models.W037 reports
+# property_available_idx, the only one; without it the available listing walks
+# property_updated_id_idx instead. Silenced only there; QueryPlanTests fails
+# if another partial index appears for the warning to hide.
+if 'mysql' in DATABASES['default']['ENGINE']:
+    SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -180,19 +188,34 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'utils.CustomJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'utils.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'utils.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/minute',
         'user': '200/minute',
+        'password_reset': '10/minute',  # password reset confirmations per client
     },
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
     ],
 }
 
+# Streamed list responses (?stream=true) read this many rows per query
+STREAM_CHUNK_SIZE = 500
+
 
 # JWT config
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=3),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=14),
+    'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
@@ -200,13 +223,27 @@ SIMPLE_JWT = {
 
 
 # Blacklist config storage
+# Point CACHE_BACKEND at a shared cache (e.g. django.core.cache.backends.memcached.PyMemcacheCache)
+# in production so versions and cached responses are shared across gunicorn workers
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='unique-snowflake'),
     }
 }
 
+# Property response cache lifetime, entries are invalidated earlier by version bumps.
+# With the per-process LocMemCache a write only bumps the versions of the worker that
+# handled it, so cached responses and the versions behind ETags last a few seconds only
+PROPERTY_CACHE_SHARED = 'locmem' not in CACHES['default']['BACKEND']
+PROPERTY_CACHE_TIMEOUT = 60 * 60 * 24 if PROPERTY_CACHE_SHARED else 5  # 24 hours or 5 sec
+PROPERTY_VERSION_TIMEOUT = None if PROPERTY_CACHE_SHARED else PROPERTY_CACHE_TIMEOUT
+
+# Response compression (see core.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024  # bytes, shorter responses are sent uncompressed
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11, higher levels are smaller but much slower
+COMPRESSION_CACHE_TIMEOUT = PROPERTY_CACHE_TIMEOUT  # compressed bodies of cached responses
+
 
 # Cloudinary configuration
 CLOUDINARY_STORAGE = {
@@ -228,7 +265,38 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = False
 EMAIL_USE_SSL = True
-EMAIL_TIMEOUT = 3600  # 3600 sec
+EMAIL_TIMEOUT = 30  # 30 sec
+
+# Bounded email worker pool (see utils.EmailDispatcher)
+EMAIL_WORKERS = 2
+EMAIL_QUEUE_SIZE = 500
+EMAIL_QUEUE_TIMEOUT = 2  # sec to wait for queue space before dropping an email
+EMAIL_BATCH_SIZE = 20  # messages sent over one SMTP connection
+EMAIL_SHUTDOWN_TIMEOUT = 30  # sec to drain the queue on shutdown
+
+# Durable email outbox (see the process_email_outbox command)
+EMAIL_OUTBOX_GRACE = 60  # sec before the command retries an email the pool has not sent
+EMAIL_OUTBOX_BACKOFF = 30  # sec, doubled after every failed attempt
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 60 * 5  # sec before an email claimed by a sender that died is sent again
+
+# Revoked access tokens
+TOKEN_REVOCATION_SYNC_INTERVAL = 5  # sec between fetching new revocations into the Bloom filter
+TOKEN_REVOCATION_REBUILD_INTERVAL = 60 * 10  # sec between full rebuilds, which drop expired tokens
+TOKEN_REVOCATION_CAPACITY = 100000
+TOKEN_REVOCATION_ERROR_RATE = 0.001
+TOKEN_GENERATION_CACHE_TIMEOUT = 60  # sec a worker may keep using a cached token generation
+
+# Build request.user from the token claims instead of querying the user table
+JWT_STATELESS_USER = config('JWT_STATELESS_USER', default=True, cast=bool)
+USER_CACHE_TIMEOUT = 30  # sec a worker reuses a user row loaded for a request
+USER_CACHE_SIZE = 1000
+
+# Password reset codes live in the cache, which must be shared across workers;
+# with the per-process LocMemCache they stay in the database
+PASSWORD_RESET_OTP_STORE = config('PASSWORD_RESET_OTP_STORE', default='database' if 'locmem' in CACHES['default']['BACKEND'] else 'cache')
+PASSWORD_RESET_OTP_TIMEOUT = 60 * 10  # 10 minutes
+PASSWORD_RESET_MAX_ATTEMPTS = 5  # wrong codes naming an account before its code is revoked
 
 
 # Error logger configuration
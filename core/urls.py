@@ -19,7 +19,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from users.views import UsersView, SignUpView, LogInView, LogOutView, ResetPasswordView, ConfirmPasswordView
+from users.views import UsersView, SignUpView, LogInView, LogOutView, TokenView, ResetPasswordView, ConfirmPasswordView
 from properties.views import PropertyViewSet, FavoriteViewSet, EnquiryViewSet
 
 # Swagger UI
@@ -41,6 +41,7 @@ router.register(r'users/manage', UsersView, basename="manage_user")
 router.register(r'users/signup', SignUpView, basename="signup")
 router.register(r'users/login', LogInView, basename="login")
 router.register(r'users/logout', LogOutView, basename="logout")
+router.register(r'users/token', TokenView, basename="token")
 router.register(r'users/password/reset', ResetPasswordView, basename="password_reset")
 router.register(r'users/password/confirm', ConfirmPasswordView, basename="password_confirm")
 router.register(r'properties', PropertyViewSet, basename="manage_property")
@@ -1,8 +1,28 @@
 from django.contrib import admin
 from .models import Property
+from .search import index_property, remove_property
+from . import cache as response_cache
 
 # Register your models here.
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
     list_display = ("id", "bedroom", "bathroom", "property_type", "price", "status", "created_on")
     list_filter = ("property_type", "status")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        index_property(obj)
+        response_cache.bump_property_version(obj.pk)
+
+    def delete_model(self, request, obj):
+        remove_property(obj)
+        super().delete_model(request, obj)
+        response_cache.bump_property_version(obj.pk)
+
+    def delete_queryset(self, request, queryset):
+        objects = list(queryset)
+        for obj in objects:
+            remove_property(obj)
+        super().delete_queryset(request, queryset)
+        for obj in objects:
+            response_cache.bump_property_version(obj.pk)
@@ -0,0 +1,116 @@
+"""
+Versioned response cache for the anonymous property listing and details.
+
+Cache keys embed a catalogue version (listing) or a per-property version
+(details). Writes bump the versions instead of deleting keys, so stale
+entries are simply never read again and expire on their own. The versions
+only stay put where the cache is shared by every worker; otherwise they
+expire with the entries after PROPERTY_VERSION_TIMEOUT seconds.
+"""
+from django.core.cache import cache
+from django.conf import settings
+import hashlib, uuid
+
+CATALOGUE_VERSION_KEY = 'properties:catalogue:version'
+PROPERTY_VERSION_KEY = 'properties:property:{}:version'
+HITS_KEY = 'properties:cache:hits'
+MISSES_KEY = 'properties:cache:misses'
+
+
+def new_version():
+    # A random starting point, so a counter that was evicted and recreated never
+    # lands back on a version whose entries are still cached
+    return uuid.uuid4().int >> 66
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        cache.add(key, version, timeout=settings.PROPERTY_VERSION_TIMEOUT)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Unknown key: start over from a fresh random version
+        cache.set(key, new_version(), timeout=settings.PROPERTY_VERSION_TIMEOUT)
+
+
+def get_catalogue_version():
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def get_property_version(pk):
+    return get_version(PROPERTY_VERSION_KEY.format(normalize_pk(pk)))
+
+
+def bump_catalogue_version():
+    bump_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_property_version(pk):
+    """
+    A changed property invalidates its details and every listing page.
+    """
+    bump_version(PROPERTY_VERSION_KEY.format(normalize_pk(pk)))
+    bump_catalogue_version()
+
+
+def normalize_pk(pk):
+    # The same property can be addressed with or without dashes in its UUID
+    try:
+        return str(uuid.UUID(str(pk)))
+    except ValueError:
+        return str(pk)
+
+
+def is_cacheable(request):
+    return not request.user.is_authenticated
+
+
+def list_cache_key(request):
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f'properties:list:{get_catalogue_version()}:{digest}'
+
+
+def detail_cache_key(pk, selection=None):
+    fields = ','.join(selection) if selection else 'all'
+    return f'properties:detail:{normalize_pk(pk)}:{get_property_version(pk)}:{hashlib.md5(fields.encode()).hexdigest()}'
+
+
+def get_response(key):
+    """
+    Return the cached response data for `key`, counting the hit or miss.
+    """
+    data = cache.get(key)
+    increment(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def set_response(key, data):
+    cache.set(key, data, timeout=settings.PROPERTY_CACHE_TIMEOUT)
+
+
+def increment(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+        'catalogue_version': get_catalogue_version(),
+    }
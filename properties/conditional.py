@@ -0,0 +1,79 @@
+"""
+ETag and Last-Modified validators for the property endpoints.
+
+Validators are derived from the cache versions (and `updated_on` for details)
+without serializing the body, so `If-None-Match` / `If-Modified-Since` requests
+can be answered with a 304 before any serialization happens.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Max, Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import Favorite
+from .cache import get_catalogue_version, get_property_version, normalize_pk
+import hashlib
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def list_validators(request):
+    """
+    Every write bumps the catalogue version, so it identifies the state of the
+    whole listing without querying it. Listings get no Last-Modified: a
+    deletion does not move the newest `updated_on` forward, so
+    If-Modified-Since could not notice it.
+    """
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    etag = make_etag('list', get_catalogue_version(), params, get_favorites_state(request))
+    return etag, None
+
+
+def detail_validators(request, queryset, pk):
+    """
+    Return (etag, last_modified) for a single property, or None if it does not exist.
+    """
+    fields = ['updated_on', 'is_favorited'] if request.user.is_authenticated else ['updated_on']
+    try:
+        row = queryset.filter(pk=pk).values_list(*fields).first()
+    except ValidationError:
+        # Not a valid UUID
+        return None
+    if row is None:
+        return None
+    last_modified = row[0]
+    # The query string selects the fields in the body
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    etag = make_etag('detail', normalize_pk(pk), get_property_version(pk), last_modified.isoformat(), params, *row[1:])
+    if request.user.is_authenticated:
+        return etag, None
+    return etag, int(last_modified.timestamp())
+
+
+def get_favorites_state(request):
+    """
+    The number and latest timestamp of the user's favorites, which changes
+    whenever a favorite is added or removed.
+    """
+    if not request.user.is_authenticated:
+        return None
+    state = Favorite.objects.filter(user_id=request.user.pk).aggregate(count=Count('pk'), latest=Max('created_on'))
+    return state['count'], state['latest'] and state['latest'].isoformat()
+
+
+def get_not_modified(request, etag, last_modified):
+    """
+    A 304 response when the client's copy is still current, otherwise None.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,137 @@
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.exceptions import ValidationError
+from django.db.models import Q
+from .search import search_properties
+from .geo import bounding_box, distance_expression
+
+
+class PropertyFilterBackend(BaseFilterBackend):
+    """
+    Structured, index friendly filtering for the property listing.
+
+    - `?state=Lagos` exact match, `?state__in=Lagos,Oyo` membership
+    - `?min_price=100000&max_price=500000` inclusive ranges
+    - `?ordering=-price,bedroom` whitelisted ordering
+    """
+    exact_fields = ('state', 'city', 'property_type', 'status')
+    range_fields = ('bedroom', 'bathroom', 'price')
+    ordering_fields = ('price', 'bedroom', 'bathroom', 'created_on', 'updated_on')
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {}
+        for field in self.exact_fields:
+            if params.get(field):
+                filters[field] = params[field]
+            if params.get(f'{field}__in'):
+                filters[f'{field}__in'] = [value.strip() for value in params[f'{field}__in'].split(',') if value.strip()]
+        for field in self.range_fields:
+            for prefix, lookup in (('min', 'gte'), ('max', 'lte')):
+                param = f'{prefix}_{field}'
+                if params.get(param):
+                    filters[f'{field}__{lookup}'] = self.get_number(param, params[param])
+        if filters:
+            queryset = queryset.filter(**filters)
+
+        ordering = self.get_ordering(request)
+        if ordering:
+            # Break ties on the primary key in the same direction so (price, id) indexes apply
+            tiebreaker = '-pk' if ordering[-1].startswith('-') else 'pk'
+            queryset = queryset.order_by(*ordering, tiebreaker)
+        return queryset
+
+    def get_number(self, param, value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValidationError(f'{param} must be a whole number')
+        if number < 0:
+            raise ValidationError(f'{param} must not be negative')
+        return number
+
+    def get_ordering(self, request):
+        ordering = []
+        for field in request.query_params.get(self.ordering_param, '').split(','):
+            field = field.strip()
+            if not field:
+                continue
+            if field.lstrip('-') not in self.ordering_fields:
+                raise ValidationError(f'Ordering by {field.lstrip("-")} is not supported')
+            ordering.append(field)
+        return ordering
+
+    def get_schema_fields(self, view):
+        return []
+
+
+class PropertySearchFilter(BaseFilterBackend):
+    """
+    Relevance ranked full-text search with `?search=` over the description,
+    address, city, state, property type and status. Results are ordered by relevance unless `?ordering=` is given.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        queryset = search_properties(queryset, term)
+        if not request.query_params.get(PropertyFilterBackend.ordering_param):
+            queryset = queryset.order_by('-relevance', '-pk')
+        return queryset
+
+    def get_schema_fields(self, view):
+        return []
+
+
+class PropertyGeoFilterBackend(BaseFilterBackend):
+    """
+    Proximity and map viewport filtering.
+
+    - `?lat=6.45&lng=3.39&radius=5` properties within 5 km, nearest first
+    - `?bbox=south,west,north,east` properties inside the map viewport
+    """
+    max_radius = 100
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('bbox'):
+            south, west, north, east = self.get_coordinates('bbox', params['bbox'], 4)
+            queryset = self.filter_box(queryset, south, west, north, east)
+
+        if params.get('lat') or params.get('lng') or params.get('radius'):
+            latitude = self.get_coordinates('lat', params.get('lat', ''), 1)[0]
+            longitude = self.get_coordinates('lng', params.get('lng', ''), 1)[0]
+            radius = self.get_coordinates('radius', params.get('radius', ''), 1)[0]
+            if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                raise ValidationError('lat and lng must be valid coordinates')
+            if not 0 < radius <= self.max_radius:
+                raise ValidationError(f'radius must be between 0 and {self.max_radius} km')
+            # Narrow down through the coordinate index before the exact distance check
+            queryset = self.filter_box(queryset, *bounding_box(latitude, longitude, radius))
+            queryset = queryset.annotate(distance=distance_expression(latitude, longitude)).filter(distance__lte=radius)
+            if not params.get(PropertyFilterBackend.ordering_param) and not params.get(PropertySearchFilter.search_param):
+                queryset = queryset.order_by('distance', 'pk')
+        return queryset
+
+    def filter_box(self, queryset, south, west, north, east):
+        queryset = queryset.filter(latitude__range=(south, north))
+        if west <= east:
+            return queryset.filter(longitude__range=(west, east))
+        # The viewport crosses the antimeridian
+        return queryset.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+
+    def get_coordinates(self, param, value, count):
+        try:
+            coordinates = [float(part) for part in value.split(',')]
+        except ValueError:
+            coordinates = []
+        if len(coordinates) != count:
+            if count == 1:
+                raise ValidationError(f'{param} must be a number')
+            raise ValidationError(f'{param} must be {count} comma separated numbers')
+        return coordinates
+
+    def get_schema_fields(self, view):
+        return []
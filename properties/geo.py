@@ -0,0 +1,91 @@
+"""
+Geospatial helpers for proximity search, map viewports and clustering.
+"""
+from django.db.models import FloatField, Count, Avg, Min
+from django.db.models.functions import Cast, Radians, Sin, Cos, ASin, Sqrt, Power, Substr
+from math import cos, radians
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=12):
+    """
+    Standard base32 geohash; nearby points share a common prefix.
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+    while len(geohash) < precision:
+        interval, value = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return ''.join(geohash)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Return (south, west, north, east) of the box enclosing the circle, used to
+    narrow the search through the (latitude, longitude) index first.
+    """
+    lat_delta = radius_km / 111.32
+    lng_delta = radius_km / max(111.32 * cos(radians(latitude)), 0.01)
+    south, north = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if lng_delta >= 180 or south == -90.0 or north == 90.0:
+        # The circle reaches a pole, so every longitude is in range
+        return south, -180.0, north, 180.0
+    west, east = longitude - lng_delta, longitude + lng_delta
+    # Wrap across the antimeridian; west > east then means the box crosses it
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, west, north, east
+
+
+def distance_expression(latitude, longitude):
+    """
+    Haversine great-circle distance in kilometres from the given point.
+    """
+    lat = Radians(Cast('latitude', FloatField()))
+    lng = Radians(Cast('longitude', FloatField()))
+    origin_lat, origin_lng = radians(latitude), radians(longitude)
+    a = (
+        Power(Sin((lat - origin_lat) / 2), 2)
+        + cos(origin_lat) * Cos(lat) * Power(Sin((lng - origin_lng) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def cluster_properties(queryset, precision):
+    """
+    Aggregate properties into geohash cells of the given precision for
+    zoomed-out map views.
+    """
+    buckets = (
+        queryset.exclude(geohash='')
+        .annotate(cell=Substr('geohash', 1, precision))
+        .order_by()
+        .values('cell')
+        .annotate(count=Count('pk'), latitude=Avg('latitude'), longitude=Avg('longitude'), min_price=Min('price'))
+        .order_by('-count')
+    )
+    return [
+        {
+            'geohash': bucket['cell'],
+            'count': bucket['count'],
+            'latitude': round(float(bucket['latitude']), 6),
+            'longitude': round(float(bucket['longitude']), 6),
+            'min_price': bucket['min_price'],
+        }
+        for bucket in buckets
+    ]
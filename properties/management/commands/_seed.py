@@ -0,0 +1,79 @@
+from django.db import connection, transaction
+from properties.models import Property
+from contextlib import contextmanager
+from time import perf_counter
+import random
+
+STATES = {
+    'Lagos': ['Ikeja', 'Lekki', 'Yaba', 'Surulere', 'Ikorodu'],
+    'Oyo': ['Ibadan', 'Ogbomosho', 'Oyo'],
+    'Abuja': ['Garki', 'Wuse', 'Maitama', 'Gwarinpa'],
+    'Rivers': ['Port Harcourt', 'Bonny'],
+    'Ogun': ['Abeokuta', 'Ota', 'Ijebu Ode'],
+}
+
+
+def seed_properties(count, batch_size=5000, seed=42):
+    """
+    Bulk insert `count` random listings for benchmarks and refresh the
+    planner statistics so EXPLAIN reflects a realistic catalogue.
+    """
+    rng = random.Random(seed)
+    property_types = [choice for choice, _ in Property.PROPERTY_TYPE_CHOICES]
+    statuses = [choice for choice, _ in Property.STATUS_CHOICES]
+    batch = []
+    for index in range(count):
+        state = rng.choice(list(STATES))
+        batch.append(Property(
+            bedroom=rng.randint(1, 6),
+            bathroom=rng.randint(1, 5),
+            description=f'Benchmark listing {index} with a spacious parlour and steady water supply',
+            property_type=rng.choice(property_types),
+            price=rng.randrange(50000, 50000000, 5000),
+            address=f'{rng.randint(1, 300)} Benchmark Street',
+            city=rng.choice(STATES[state]),
+            state=state,
+            status=rng.choice(statuses),
+            cover_image='elbis/cover_images/benchmark.jpg',
+            video_url='https://www.youtube.com/watch?v=benchmark',
+        ))
+        if len(batch) == batch_size:
+            Property.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Property.objects.bulk_create(batch)
+    analyze_properties()
+
+
+def analyze_properties():
+    # ANALYZE TABLE commits the benchmark's transaction on MySQL, which would keep
+    # the seeded rows; InnoDB recalculates its statistics after a bulk insert anyway
+    if connection.vendor == 'mysql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+@contextmanager
+def seeded_catalogue(count):
+    """
+    Seed `count` listings for the duration of the block. Everything written
+    inside it is rolled back on exit, so benchmark rows are never kept.
+    """
+    with transaction.atomic():
+        seed_properties(count)
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(function, repeat):
+    """
+    Best of `repeat` calls of `function` in milliseconds, with the last result.
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        started = perf_counter()
+        result = function()
+        elapsed = (perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
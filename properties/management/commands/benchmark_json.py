@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from properties.models import Property
+from properties.serializers import PropertySerializer
+from utils import FastJSONRenderer, orjson
+from ._seed import seeded_catalogue, measure
+
+
+class Command(BaseCommand):
+    help = "Compare the encode throughput of DRF's JSONRenderer and FastJSONRenderer on a property listing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write("orjson is not installed, FastJSONRenderer falls back to the stdlib encoder")
+        request = Request(APIRequestFactory().get('/v1/api/properties', HTTP_HOST='127.0.0.1'))
+        self.stdout.write(f"Seeding {options['rows']} properties...")
+        with seeded_catalogue(options['rows']):
+            properties = PropertySerializer(Property.objects.all(), many=True, context={'request': request}).data
+
+        data = {"success": True, "status": 200, "message": "Properties listed successfully", "data": properties}
+        drf = measure(lambda: JSONRenderer().render(data), options['repeat'])
+        fast = measure(lambda: FastJSONRenderer().render(data), options['repeat'])
+        if drf[1] != fast[1]:
+            raise CommandError("The renderers' outputs differ")
+        size = len(drf[1]) / 1024 / 1024
+        self.stdout.write(f"{options['rows']} rows, {size:.1f} MiB")
+        self.stdout.write(f"  JSONRenderer     {drf[0]:8.1f} ms {size / drf[0] * 1000:8.1f} MiB/s")
+        self.stdout.write(f"  FastJSONRenderer {fast[0]:8.1f} ms {size / fast[0] * 1000:8.1f} MiB/s ({drf[0] / fast[0]:.1f}x)")
+
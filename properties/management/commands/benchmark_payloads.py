@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+from users.models import UserModel
+from ._seed import seeded_catalogue, measure
+
+VARIANTS = [
+    ('full', {}),
+    ('view=card', {'view': 'card'}),
+    ('fields=id,price,city', {'fields': 'id,price,city'}),
+    ('exclude=description', {'exclude': 'description'}),
+]
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway catalogue and compare payload size and latency of the listing's field selections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['rows']} properties...")
+        with seeded_catalogue(options['rows']):
+            # An authenticated client bypasses the anonymous response cache
+            user = UserModel.objects.create_user('payloads@benchmark.elbis.com', 'benchmark-password', first_name='Bench', last_name='Mark')
+            client = APIClient(HTTP_HOST='127.0.0.1')
+            client.force_authenticate(user)
+            for label, page in [(f"page of {options['page_size']}", {'page_size': options['page_size']}), ('whole catalogue', {})]:
+                self.stdout.write(f"\n{label}:")
+                for name, params in VARIANTS:
+                    elapsed, response = measure(lambda: client.get('/v1/api/properties', {**params, **page}), options['repeat'])
+                    size = len(response.content)
+                    self.stdout.write(f"  {name:<22} {size / 1024:10.1f} KiB {elapsed:9.1f} ms")
+
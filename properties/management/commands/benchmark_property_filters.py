@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from properties.models import Property
+from properties.filters import PropertyFilterBackend
+from properties.plans import is_bounded_walk, is_full_scan, uses_filesort
+from ._seed import seeded_catalogue, measure
+
+QUERIES = [
+    'state=Lagos',
+    'state=Lagos&city=Lekki',
+    'state__in=Lagos,Oyo&status=Available',
+    'status=Available&min_price=1000000&max_price=5000000',
+    'property_type=Duplex&max_price=20000000&ordering=price',
+    'ordering=-price',
+    'min_bedroom=3&status=Available&ordering=price',
+]
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway catalogue and report the query plan and latency of each listing filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['rows']} properties...")
+        with seeded_catalogue(options['rows']):
+            for query in QUERIES:
+                self.report(query, options['repeat'])
+
+    def report(self, query, repeat):
+        request = Request(APIRequestFactory().get('/v1/api/properties', data=None, QUERY_STRING=query))
+        queryset = PropertyFilterBackend().filter_queryset(request, Property.objects.all(), None)[:20]
+        plan = queryset.explain()
+        elapsed, _ = measure(lambda: list(queryset.values_list('pk', flat=True)), repeat)
+        full_scan = is_full_scan(plan) and not is_bounded_walk(plan, str(queryset.query))
+        verdict = self.style.ERROR('FULL SCAN') if full_scan else self.style.WARNING('filesort') if uses_filesort(plan) else self.style.SUCCESS('index')
+        self.stdout.write(f"\n?{query}  [{verdict}] {elapsed:.2f} ms\n{plan}")
+
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from properties.models import Property
+from properties.serializers import PropertySerializer
+from utils import compile_serializer
+from ._seed import seeded_catalogue, measure
+import json
+
+
+class Command(BaseCommand):
+    help = "Compare PropertySerializer with the compiled values() serializer on listings of increasing size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help="Comma separated row counts")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        request = Request(APIRequestFactory().get('/v1/api/properties', HTTP_HOST='127.0.0.1'))
+        context = {'request': request}
+        self.stdout.write(f"Seeding {max(sizes)} properties...")
+        with seeded_catalogue(max(sizes)):
+            queryset = Property.objects.order_by('-updated_on', '-id')
+            for size in sizes:
+                fast = compile_serializer(PropertySerializer(context=context))
+                drf = measure(lambda: PropertySerializer(list(queryset[:size]), many=True, context=context).data, options['repeat'])
+                compiled = measure(lambda: fast.serialize(fast.get_values(queryset)[:size]), options['repeat'])
+                if json.dumps(drf[1]) != json.dumps(compiled[1]):
+                    raise CommandError(f"Outputs differ at {size} rows")
+                self.stdout.write(
+                    f"{size:>7} rows: DRF {drf[0]:8.1f} ms, compiled {compiled[0]:8.1f} ms ({drf[0] / compiled[0]:.1f}x)"
+                )
+
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_auto_20241231_1659'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['-updated_on', '-id'], name='property_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.2 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from decimal import Decimal
+import re
+
+PRICE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(k|m|bn|b|thousand|million|billion)?')
+MULTIPLIERS = {
+    None: 1,
+    'k': 1000, 'thousand': 1000,
+    'm': 1000000, 'million': 1000000,
+    'b': 1000000000, 'bn': 1000000000, 'billion': 1000000000,
+}
+
+
+def parse_price(text):
+    """
+    The whole naira amount of a free-text price such as "₦250,000", "250k" or
+    "1.5m", or None when it cannot be read.
+    """
+    text = re.sub(r'[\s,]', '', (text or '').lower())
+    text = re.sub(r'^(₦|ngn|naira|n)', '', text)
+    text = re.sub(r'(naira|ngn)$', '', text)
+    match = PRICE_PATTERN.fullmatch(text)
+    if match is None:
+        return None
+    return int(Decimal(match.group(1)) * MULTIPLIERS[match.group(2)])
+
+
+def check_prices(apps, schema_editor):
+    """
+    Stop before the schema changes if a price cannot be read, rather than
+    storing a wrong amount that would match price ranges and sort with the
+    real ones.
+    """
+    Property = apps.get_model('properties', 'Property')
+    unreadable = [
+        f'{pk}: {price!r}' for pk, price in Property.objects.values_list('id', 'price').iterator()
+        if parse_price(price) is None
+    ]
+    if unreadable:
+        raise ValueError("Correct these property prices and migrate again:\n" + '\n'.join(unreadable))
+
+
+def copy_price_to_amount(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    for instance in Property.objects.only('id', 'price').iterator():
+        Property.objects.filter(pk=instance.pk).update(price_amount=parse_price(instance.price))
+
+
+def copy_amount_to_price(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    for instance in Property.objects.only('id', 'price_amount').iterator():
+        Property.objects.filter(pk=instance.pk).update(price=str(instance.price_amount))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_property_updated_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_prices, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='property',
+            name='price_amount',
+            field=models.PositiveBigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_price_to_amount, copy_amount_to_price),
+        # A default lets the text column be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='property',
+            name='price',
+            field=models.CharField(default='0', max_length=10),
+        ),
+        migrations.RemoveField(
+            model_name='property',
+            name='price',
+        ),
+        migrations.RenameField(
+            model_name='property',
+            old_name='price_amount',
+            new_name='price',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_fulltext_index(apps, schema_editor):
+    """
+    MySQL gets a FULLTEXT index; SQLite gets an FTS5 table filled with the
+    current catalogue. Other backends fall back to icontains in search.py.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX property_fulltext_idx ON properties_property (description, address, city)'
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE properties_property_fts USING fts5(property_id UNINDEXED, description, address, city)'
+            )
+        except OperationalError:
+            # SQLite built without FTS5
+            return
+        schema_editor.execute(
+            'INSERT INTO properties_property_fts (property_id, description, address, city) '
+            'SELECT id, description, address, city FROM properties_property'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('DROP INDEX property_fulltext_idx ON properties_property')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS properties_property_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_property_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_property_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='property',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
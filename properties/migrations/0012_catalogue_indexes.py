@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0011_alter_property_updated_on'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_on', '-id'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(status='Available'), fields=['-updated_on', '-id'], name='property_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['state', 'city', '-updated_on', '-id'], name='property_state_city_upd_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='property',
+            name='property_state_city_idx',
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['-created_on', '-id'], name='property_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['bedroom', 'id'], name='property_bedroom_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['bathroom', 'id'], name='property_bathroom_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+OLD_COLUMNS = ('description', 'address', 'city')
+NEW_COLUMNS = ('description', 'address', 'city', 'state', 'property_type', 'status')
+
+
+def rebuild_fulltext_index(columns):
+    """
+    Recreate the full-text index of migration 0009 over `columns`.
+    """
+    def rebuild(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        names = ', '.join(columns)
+        if vendor == 'mysql':
+            schema_editor.execute('DROP INDEX property_fulltext_idx ON properties_property')
+            schema_editor.execute(f'CREATE FULLTEXT INDEX property_fulltext_idx ON properties_property ({names})')
+        elif vendor == 'sqlite':
+            if 'properties_property_fts' not in schema_editor.connection.introspection.table_names():
+                # SQLite built without FTS5
+                return
+            schema_editor.execute('DROP TABLE properties_property_fts')
+            try:
+                schema_editor.execute(f'CREATE VIRTUAL TABLE properties_property_fts USING fts5(property_id UNINDEXED, {names})')
+            except OperationalError:
+                return
+            schema_editor.execute(
+                f'INSERT INTO properties_property_fts (property_id, {names}) SELECT id, {names} FROM properties_property'
+            )
+    return rebuild
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0012_catalogue_indexes'),
+    ]
+
+    operations = [
+        # Keep matching the state, type and status, as the search did before full-text ranking
+        migrations.RunPython(rebuild_fulltext_index(NEW_COLUMNS), rebuild_fulltext_index(OLD_COLUMNS)),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from uuid import uuid4
 from users.models import UserModel
+from .geo import encode_geohash
 
 # Create your models here.
 class Property(models.Model):
@@ -17,10 +18,13 @@ class Property(models.Model):
     electricity = models.PositiveSmallIntegerField(default=100)
     description = models.TextField()
     property_type = models.CharField(max_length=50, choices=PROPERTY_TYPE_CHOICES)
-    price = models.CharField(max_length=10)
+    price = models.PositiveBigIntegerField()
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES)
     cover_image = models.ImageField(upload_to='elbis/cover_images/')
     parlor_image = models.ImageField(upload_to='elbis/parlor_image/', blank=True)
@@ -28,13 +32,39 @@ class Property(models.Model):
     bathroom_image = models.ImageField(upload_to='elbis/bathroom_images/', blank=True)
     video_url = models.URLField()
     created_on = models.DateField(auto_now_add=True)
-    updated_on = models.DateField(auto_now=True)
+    updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-updated_on']
+        indexes = [
+            # Backs the keyset pagination of the listing (updated_on, id)
+            models.Index(fields=['-updated_on', '-id'], name='property_updated_id_idx'),
+            # Available listings in their default order; only PostgreSQL and SQLite build
+            # partial indexes, MySQL walks property_updated_id_idx instead
+            models.Index(fields=['-updated_on', '-id'], condition=models.Q(status='Available'), name='property_available_idx'),
+            # Back the structured filters and the orderings the listing accepts
+            models.Index(fields=['state', 'city', '-updated_on', '-id'], name='property_state_city_upd_idx'),
+            models.Index(fields=['status', 'price'], name='property_status_price_idx'),
+            models.Index(fields=['property_type', 'price'], name='property_type_price_idx'),
+            models.Index(fields=['price', 'id'], name='property_price_id_idx'),
+            models.Index(fields=['-created_on', '-id'], name='property_created_id_idx'),
+            models.Index(fields=['bedroom', 'id'], name='property_bedroom_id_idx'),
+            models.Index(fields=['bathroom', 'id'], name='property_bathroom_id_idx'),
+            # Bounding box lookups for radius and map viewport queries
+            models.Index(fields=['latitude', 'longitude'], name='property_lat_lng_idx'),
+            models.Index(fields=['geohash'], name='property_geohash_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id} {self.title} {self.price} {self.status}"
+
+    def save(self, *args, **kwargs):
+        # Keep the geohash used for map clustering in step with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = ''
+        super().save(*args, **kwargs)
     
 
 class Favorite(models.Model):
@@ -49,6 +79,10 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'property')
         ordering = ['-created_on']
+        indexes = [
+            # A user's favorites in the keyset order of their listing (created_on, id)
+            models.Index(fields=['user', '-created_on', '-id'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.property}"
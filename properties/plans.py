@@ -0,0 +1,78 @@
+"""
+Query plan checks shared by benchmark_property_filters and the query plan tests.
+"""
+from django.db import connection
+from .models import Property, Favorite
+
+QUOTES = '\'"`'
+
+
+def explain(sql):
+    # EXPLAIN a captured query, formatted like QuerySet.explain()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def is_full_scan(plan):
+    """
+    Whether an EXPLAIN output reads the whole property or favorite table, or
+    the whole of one of their indexes: SQLite SCAN steps, with or without an
+    index, and MySQL rows of access type ALL or index.
+    """
+    tables = (Property._meta.db_table, Favorite._meta.db_table)
+    for line in plan.splitlines():
+        words = line.split()
+        # MySQL rows start with id, select_type, table, partitions and type
+        if connection.vendor == 'mysql' and len(words) > 4 and words[2] in tables and words[4] in ('ALL', 'index'):
+            return True
+        if connection.vendor == 'sqlite' and 'SCAN' in words:
+            # SQLite before 3.36 writes SCAN TABLE <table>
+            scanned = words[words.index('SCAN') + 1:][:2]
+            if any(table in scanned for table in tables):
+                return True
+    return False
+
+
+def is_bounded_walk(plan, sql):
+    """
+    Whether a full index scan is an unfiltered, unsorted LIMIT query walking
+    the index of its ORDER BY, which stops after one page of rows.
+    """
+    outer = outer_query(sql)
+    start = outer.find(' FROM ')
+    if start == -1:
+        return False
+    outer = outer[start:]
+    return ' WHERE ' not in outer and ' LIMIT ' in outer and not uses_filesort(plan)
+
+
+def outer_query(sql):
+    """
+    The SQL with parenthesised groups and quoted text blanked out, leaving only
+    the clauses of the outermost query.
+    """
+    depth, quote, kept = 0, None, []
+    for char in sql:
+        if quote:
+            # A doubled quote closes and reopens, so escapes need no handling
+            if char == quote:
+                quote = None
+        elif char in QUOTES:
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            kept.append(char)
+            continue
+        kept.append(' ')
+    return ''.join(kept)
+
+
+def uses_filesort(plan):
+    """
+    Whether an EXPLAIN output sorts rows instead of reading them in index order.
+    """
+    return any('Using filesort' in line or 'USE TEMP B-TREE FOR ORDER BY' in line for line in plan.splitlines())
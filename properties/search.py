@@ -0,0 +1,87 @@
+"""
+Full-text search over the property description, address, city, state, type
+and status.
+
+MySQL uses the FULLTEXT index of migrations 0009 and 0013 and keeps it in sync
+by itself. SQLite (local and test runs) uses an FTS5 table that the views keep
+in sync through index_property() and remove_property(). Other backends fall
+back to a plain `icontains` match without ranking.
+"""
+from django.db import connection
+from django.db.models import Value, FloatField, Q
+from django.db.models.expressions import RawSQL
+from .models import Property
+import re
+
+FTS_TABLE = 'properties_property_fts'
+FULLTEXT_COLUMNS = ('description', 'address', 'city', 'state', 'property_type', 'status')
+
+_fts_available = None
+
+
+def get_search_backend():
+    global _fts_available
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite':
+        if _fts_available is None:
+            _fts_available = FTS_TABLE in connection.introspection.table_names()
+        return 'fts5' if _fts_available else None
+    return None
+
+
+def search_properties(queryset, term):
+    """
+    Filter the queryset down to properties matching `term`, annotated with a
+    `relevance` score where higher is better.
+    """
+    backend = get_search_backend()
+    if backend == 'mysql':
+        columns = ', '.join(f'{Property._meta.db_table}.{column}' for column in FULLTEXT_COLUMNS)
+        relevance = RawSQL(f'MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)', (term,), output_field=FloatField())
+        return queryset.annotate(relevance=relevance).filter(relevance__gt=0)
+
+    if backend == 'fts5':
+        tokens = re.findall(r'\w+', term)
+        if not tokens:
+            return queryset.annotate(relevance=Value(0.0, output_field=FloatField())).none()
+        match = ' OR '.join(f'"{token}"*' for token in tokens)
+        # bm25() is lower for better matches, so negate it into a relevance score
+        relevance = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.property_id = {Property._meta.db_table}.id',
+            (match,), output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT property_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        return queryset.filter(pk__in=matches).annotate(relevance=relevance)
+
+    condition = Q()
+    for column in FULLTEXT_COLUMNS:
+        condition |= Q(**{f'{column}__icontains': term})
+    return queryset.filter(condition).annotate(relevance=Value(0.0, output_field=FloatField()))
+
+
+def index_property(instance):
+    """
+    Add or refresh a property in the FTS5 table (no-op on MySQL).
+    """
+    if get_search_backend() != 'fts5':
+        return
+    pk = instance.pk.hex
+    columns = ', '.join(FULLTEXT_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE property_id = %s', [pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (property_id, {columns}) VALUES (%s, {", ".join(["%s"] * len(FULLTEXT_COLUMNS))})',
+            [pk, *[getattr(instance, column) for column in FULLTEXT_COLUMNS]],
+        )
+
+
+def remove_property(instance):
+    """
+    Drop a deleted property from the FTS5 table (no-op on MySQL).
+    """
+    if get_search_backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE property_id = %s', [instance.pk.hex])
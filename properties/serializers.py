@@ -1,10 +1,34 @@
 from rest_framework import serializers
 from .models import Property, Favorite
+from collections import OrderedDict
+from decimal import Decimal
+
+CARD_FIELDS = ['id', 'property_type', 'price', 'bedroom', 'bathroom', 'city', 'state', 'status', 'cover_image']
 
 class PropertySerializer(serializers.ModelSerializer):
+    is_favorited = serializers.SerializerMethodField()
+
     class Meta:
         model = Property
         fields = '__all__'
+        extra_kwargs = {
+            'latitude': {'min_value': Decimal(-90), 'max_value': Decimal(90)},
+            'longitude': {'min_value': Decimal(-180), 'max_value': Decimal(180)},
+        }
+
+    def get_fields(self):
+        # Sparse fieldsets chosen by get_field_selection(); this also reaches
+        # the nested property of the favorite serializers through the context
+        fields = super().get_fields()
+        selection = self.context.get('property_fields')
+        if selection is None:
+            return fields
+        return OrderedDict((name, fields[name]) for name in selection)
+
+    def get_is_favorited(self, obj):
+        # Annotated by PropertyViewSet for authenticated users; the favorites
+        # endpoints pass is_favorited=True in the context
+        return getattr(obj, 'is_favorited', self.context.get('is_favorited', False))
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -15,6 +39,48 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ['id', 'property', 'property_id']
         
 
+class BulkFavoriteSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.UUIDField(), required=False, default=list, max_length=200)
+    remove = serializers.ListField(child=serializers.UUIDField(), required=False, default=list, max_length=200)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError("Provide property ids to add or remove")
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError("A property cannot be added and removed at once")
+        return data
+
+
 class EnquirySerializer(serializers.Serializer):
     message = serializers.CharField(min_length=10, style={'base_template': 'textarea.html'})
-    
\ No newline at end of file
+    
+
+def get_field_selection(query_params):
+    """
+    The PropertySerializer fields requested with ?view=card (also accepted as
+    view=compact), ?fields= and ?exclude=, or None when the full
+    representation is wanted.
+    """
+    all_fields = list(PropertySerializer().fields)
+    if query_params.get('view') in ('card', 'compact'):
+        selection = list(CARD_FIELDS)
+    elif query_params.get('fields'):
+        selection = list(dict.fromkeys(field.strip() for field in query_params['fields'].split(',') if field.strip()))
+    else:
+        selection = list(all_fields)
+    exclude = [field.strip() for field in query_params.get('exclude', '').split(',') if field.strip()]
+    unknown = [field for field in selection + exclude if field not in all_fields]
+    if unknown:
+        raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}")
+    selection = [field for field in selection if field not in exclude]
+    if not selection:
+        raise serializers.ValidationError("Select at least one field")
+    return None if selection == all_fields else selection
+
+
+def get_selected_columns(selection):
+    """
+    The model columns behind a field selection, for .only().
+    """
+    concrete = {field.name for field in Property._meta.concrete_fields}
+    return [field for field in selection if field in concrete]
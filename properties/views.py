@@ -1,19 +1,80 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from django.db.models import Exists, OuterRef
+from django.db import transaction
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from threading import Thread
-from utils import send_async_email, general_logger
+from utils import KeysetPagination, compile_serializer, stream_list, wants_stream, queue_email, general_logger
 from .models import Property, Favorite
-from .serializers import PropertySerializer, FavoriteSerializer, EnquirySerializer
+from .filters import PropertyFilterBackend, PropertySearchFilter, PropertyGeoFilterBackend
+from .geo import cluster_properties
+from .search import index_property, remove_property
+from . import cache as response_cache
+from .conditional import list_validators, detail_validators, get_not_modified, set_validators
+from .serializers import PropertySerializer, FavoriteSerializer, BulkFavoriteSerializer, EnquirySerializer, get_field_selection, get_selected_columns
+
+# Sparse fieldsets, accepted by the property listing and details
+property_field_parameters = [
+    openapi.Parameter('view', openapi.IN_QUERY, description="Use 'card' to return only the fields shown on a property card", type=openapi.TYPE_STRING),
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
+    openapi.Parameter('exclude', openapi.IN_QUERY, description="Comma separated fields to leave out", type=openapi.TYPE_STRING),
+]
+
+# Query parameters accepted by the property listing
+property_list_parameters = [
+    openapi.Parameter('search', openapi.IN_QUERY, description="Full-text search over description, address, city, state, type and status, ranked by relevance", type=openapi.TYPE_STRING),
+    openapi.Parameter('state', openapi.IN_QUERY, description="Exact state, or a comma separated list with state__in", type=openapi.TYPE_STRING),
+    openapi.Parameter('city', openapi.IN_QUERY, description="Exact city, or a comma separated list with city__in", type=openapi.TYPE_STRING),
+    openapi.Parameter('property_type', openapi.IN_QUERY, description="Exact property type, or a comma separated list with property_type__in", type=openapi.TYPE_STRING),
+    openapi.Parameter('status', openapi.IN_QUERY, description="Exact status, or a comma separated list with status__in", type=openapi.TYPE_STRING),
+    openapi.Parameter('min_bedroom', openapi.IN_QUERY, description="Minimum number of bedrooms", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('max_bedroom', openapi.IN_QUERY, description="Maximum number of bedrooms", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('min_bathroom', openapi.IN_QUERY, description="Minimum number of bathrooms", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('max_bathroom', openapi.IN_QUERY, description="Maximum number of bathrooms", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('min_price', openapi.IN_QUERY, description="Minimum price", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('max_price', openapi.IN_QUERY, description="Maximum price", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('ordering', openapi.IN_QUERY, description="Order by price, bedroom, bathroom, created_on or updated_on; prefix with - for descending", type=openapi.TYPE_STRING),
+    openapi.Parameter('lat', openapi.IN_QUERY, description="Latitude of the centre of a radius search", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('lng', openapi.IN_QUERY, description="Longitude of the centre of a radius search", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('radius', openapi.IN_QUERY, description="Radius in km around lat/lng (max 100), nearest first", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('bbox', openapi.IN_QUERY, description="Map viewport as south,west,north,east", type=openapi.TYPE_STRING),
+    openapi.Parameter('cluster', openapi.IN_QUERY, description="Return geohash clusters of this precision (1-8) instead of properties", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the next or previous field of a paginated response", type=openapi.TYPE_STRING),
+    openapi.Parameter('page_size', openapi.IN_QUERY, description="Paginate the listing with this many properties per page (max 100)", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every matching property in one unpaginated response", type=openapi.TYPE_BOOLEAN),
+] + property_field_parameters
+
+
+def get_ordering_fields(paginator, queryset):
+    # The columns keyset pagination reads its cursor from
+    return [field.lstrip('-') for field in paginator.get_ordering(queryset)]
+
 
 # Create your views here.
 class PropertyViewSet(viewsets.ModelViewSet):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
     parser_classes = (MultiPartParser, FormParser)
-    search_fields = ['bedroom', 'property_type', 'price', 'state', 'status']
+    pagination_class = KeysetPagination
+    filter_backends = [PropertyFilterBackend, PropertySearchFilter, PropertyGeoFilterBackend]
+
+    def get_queryset(self):
+        queryset = Property.objects.all()
+        user = self.request.user
+        if user.is_authenticated:
+            # Flag the user's favorites in the same query instead of a second round trip
+            favorites = Favorite.objects.filter(user_id=user.pk, property_id=OuterRef('pk'))
+            queryset = queryset.annotate(is_favorited=Exists(favorites))
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve']:
+            context['property_fields'] = get_field_selection(self.request.query_params)
+        return context
 
     def get_permissions(self):
         """
@@ -25,20 +86,63 @@ class PropertyViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
 
-    @swagger_auto_schema(manual_parameters=[openapi.Parameter('search', openapi.IN_QUERY, description="Search by bedroom, property_type, price, state, or status", type=openapi.TYPE_STRING),], responses={200: 'OK', 404: 'NOT FOUND'})
+    @swagger_auto_schema(manual_parameters=property_list_parameters, responses={200: 'OK', 304: 'NOT MODIFIED', 400: 'BAD REQUEST', 404: 'NOT FOUND'})
     def list(self, request, *args, **kwargs):
+        cache_key = response_cache.list_cache_key(request) if response_cache.is_cacheable(request) else None
+        if cache_key:
+            cached = response_cache.get_response(cache_key)
+            if cached is not None:
+                return self.cached_response(request, cache_key, cached)
         try:
             objects = self.filter_queryset(self.get_queryset())
-            if not objects:
-                raise Property.DoesNotExist
-            serializer = self.get_serializer(objects, many=True)
+            etag, last_modified = list_validators(request)
+            not_modified = get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            if request.query_params.get('cluster'):
+                response_data = self.cluster(request, objects)
+            elif wants_stream(request):
+                # Exports read the whole catalogue, so they are streamed and never cached
+                if not objects.exists():
+                    raise Property.DoesNotExist
+                response = stream_list(objects, self.get_serializer(), {
+                    "success": True,
+                    "status": 200,
+                    "message": "Properties listed successfully",
+                })
+                return set_validators(response, etag, last_modified)
+            else:
+                # Serialize plain values() rows instead of model instances
+                fast = compile_serializer(self.get_serializer())
+                if fast is not None:
+                    objects = fast.get_values(objects, *get_ordering_fields(self.paginator, objects))
+                page = self.paginate_queryset(objects)
+                if page is not None:
+                    objects = page
+                if not objects:
+                    raise Property.DoesNotExist
+                data = fast.serialize(objects) if fast is not None else self.get_serializer(objects, many=True).data
+                response_data = {
+                    "success": True,
+                    "status": 200,
+                    "message": "Properties listed successfully",
+                    "data": data
+                }
+                if page is not None:
+                    response_data.update(self.paginator.get_cursors())
+            response = Response(response_data, status=status.HTTP_200_OK)
+            if cache_key:
+                response_cache.set_response(cache_key, {'data': response_data, 'etag': etag, 'last_modified': last_modified})
+                response['X-Cache'] = 'MISS'
+                response.compression_cache_key = cache_key
+            return set_validators(response, etag, last_modified)
+        except ValidationError as e:
             response_data = {
-                "success": True,
-                "status": 200,
-                "message": "Properties listed successfully",
-                "data": serializer.data
+                "success": False,
+                "status": 400,
+                "message": e.detail[0],
             }
-            return Response(response_data, status=status.HTTP_200_OK)
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         except Property.DoesNotExist:
             response_data = {
                 "success": False,
@@ -47,12 +151,57 @@ class PropertyViewSet(viewsets.ModelViewSet):
             }
             return Response(response_data, status=status.HTTP_404_NOT_FOUND)
 
+    def cached_response(self, request, cache_key, cached):
+        """
+        Serve a cache entry, honouring conditional headers with its stored validators.
+        """
+        not_modified = get_not_modified(request, cached['etag'], cached['last_modified'])
+        if not_modified is not None:
+            return not_modified
+        response = Response(cached['data'], status=status.HTTP_200_OK, headers={'X-Cache': 'HIT'})
+        response.compression_cache_key = cache_key
+        return set_validators(response, cached['etag'], cached['last_modified'])
+
+    @swagger_auto_schema(responses={200: 'OK'})
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request, *args, **kwargs):
+        response_data = {
+            "success": True,
+            "status": 200,
+            "message": "Cache statistics retrieved successfully",
+            "data": response_cache.get_stats()
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def cluster(self, request, objects):
+        """
+        Aggregated map buckets for zoomed-out views instead of individual pins.
+        """
+        try:
+            precision = int(request.query_params['cluster'])
+        except ValueError:
+            precision = 0
+        if not 1 <= precision <= 8:
+            raise ValidationError('cluster must be a precision between 1 and 8')
+        buckets = cluster_properties(objects, precision)
+        if not buckets:
+            raise Property.DoesNotExist
+        response_data = {
+            "success": True,
+            "status": 200,
+            "message": "Property clusters listed successfully",
+            "data": buckets
+        }
+        return response_data
+
     @swagger_auto_schema(request_body=PropertySerializer, responses={201: 'CREATED', 400: 'BAD REQUEST'})
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            index_property(serializer.instance)
+            response_cache.bump_catalogue_version()
             headers = self.get_success_headers(serializer.data)
             response_data = {
                 "success": True,
@@ -70,10 +219,35 @@ class PropertyViewSet(viewsets.ModelViewSet):
             }
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
-    @swagger_auto_schema(responses={200: 'OK', 404: 'NOT FOUND'})
+    @swagger_auto_schema(manual_parameters=property_field_parameters, responses={200: 'OK', 304: 'NOT MODIFIED', 400: 'BAD REQUEST', 404: 'NOT FOUND'})
     def retrieve(self, request, pk=None, *args, **kwargs):
         try:
-            instance = Property.objects.get(pk=pk)
+            selection = get_field_selection(request.query_params)
+        except ValidationError as e:
+            response_data = {
+                "success": False,
+                "status": 400,
+                "message": e.detail[0],
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        cache_key = response_cache.detail_cache_key(pk, selection) if response_cache.is_cacheable(request) else None
+        if cache_key:
+            cached = response_cache.get_response(cache_key)
+            if cached is not None:
+                return self.cached_response(request, cache_key, cached)
+        try:
+            validators = detail_validators(request, self.get_queryset(), pk)
+            if validators is None:
+                raise Property.DoesNotExist
+            etag, last_modified = validators
+            not_modified = get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            queryset = self.get_queryset()
+            if selection is not None:
+                # Only fetch the columns that are returned
+                queryset = queryset.only(*get_selected_columns(selection))
+            instance = queryset.get(pk=pk)
             serializer = self.get_serializer(instance)
             response_data = {
                 "success": True,
@@ -81,7 +255,12 @@ class PropertyViewSet(viewsets.ModelViewSet):
                 "message": "Property retrieved successfully",
                 "data": serializer.data
             }
-            return Response(response_data, status=status.HTTP_200_OK)
+            response = Response(response_data, status=status.HTTP_200_OK)
+            if cache_key:
+                response_cache.set_response(cache_key, {'data': response_data, 'etag': etag, 'last_modified': last_modified})
+                response['X-Cache'] = 'MISS'
+                response.compression_cache_key = cache_key
+            return set_validators(response, etag, last_modified)
         except Property.DoesNotExist:
             response_data = {
                 "success": False,
@@ -107,6 +286,8 @@ class PropertyViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(instance, data=request.data, partial=partial)
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            index_property(serializer.instance)
+            response_cache.bump_property_version(instance.pk)
             response_data = {
                 "success": True,
                 "status": 200,
@@ -141,7 +322,9 @@ class PropertyViewSet(viewsets.ModelViewSet):
             instance.cover_image.delete()
             instance.bedroom_image.delete()
             instance.bathroom_image.delete()
+            remove_property(instance)
             instance.delete()
+            response_cache.bump_property_version(pk)
             response_data = {
                 "success": True,
                 "status": 204,
@@ -161,26 +344,65 @@ class FavoriteViewSet(viewsets.ViewSet):
     queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Favorite.objects.none()
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.filter(user_id=self.request.user.pk)
 
-    @swagger_auto_schema(responses={200: 'OK', 404: 'NOT FOUND'})
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('view', openapi.IN_QUERY, description="Use 'card' (or 'compact') to return only the property card fields", type=openapi.TYPE_STRING),
+        openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated property fields to return", type=openapi.TYPE_STRING),
+        openapi.Parameter('exclude', openapi.IN_QUERY, description="Comma separated property fields to leave out", type=openapi.TYPE_STRING),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the next or previous field of a paginated response", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Paginate the favorites with this many entries per page (max 100)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every favorite in one unpaginated response", type=openapi.TYPE_BOOLEAN),
+    ], responses={200: 'OK', 400: 'BAD REQUEST', 404: 'NOT FOUND'})
     def list(self, request, *args, **kwargs):
         try:
+            # Favorites and their properties come back in a single query
             favorites = self.get_queryset()
+            selection = get_field_selection(request.query_params)
+            context = {'is_favorited': True, 'property_fields': selection}
+            if wants_stream(request):
+                if not favorites.exists():
+                    raise Favorite.DoesNotExist
+                return stream_list(favorites.select_related('property'), FavoriteSerializer(context=context), {
+                    "success": True,
+                    "status": 200,
+                    "message": "Favorites listed successfully",
+                })
+            paginator = self.pagination_class()
+            fast = compile_serializer(FavoriteSerializer(context=context))
+            if fast is not None:
+                favorites = fast.get_values(favorites, *get_ordering_fields(paginator, favorites))
+            else:
+                favorites = favorites.select_related('property')
+                if selection is not None:
+                    favorites = favorites.only('id', 'created_on', 'property_id', *[f'property__{column}' for column in get_selected_columns(selection)])
+            page = paginator.paginate_queryset(favorites, request, view=self)
+            if page is not None:
+                favorites = page
             if not favorites:
                 raise Favorite.DoesNotExist
-            serializer = FavoriteSerializer(favorites, many=True)
+            data = fast.serialize(favorites) if fast is not None else FavoriteSerializer(favorites, many=True, context=context).data
             response_data = {
                 "success": True,
                 "status": 200,
                 "message": "Favorites listed successfully",
-                "data": serializer.data
+                "data": data
             }
+            if page is not None:
+                response_data.update(paginator.get_cursors())
             return Response(response_data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            response_data = {
+                "success": False,
+                "status": 400,
+                "message": e.detail[0],
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         except Favorite.DoesNotExist:
             response_data = {
                 "success": False,
@@ -196,8 +418,8 @@ class FavoriteViewSet(viewsets.ViewSet):
             serializer.is_valid(raise_exception=True)
             property_id = serializer.validated_data['property_id']
             property = Property.objects.get(pk=property_id)
-            user = request.user
-            Favorite.objects.get_or_create(user=user, property=property)
+            user_id = request.user.pk
+            Favorite.objects.get_or_create(user_id=user_id, property=property)
             response_data = {
                 "success": True,
                 "status": 201,
@@ -220,12 +442,63 @@ class FavoriteViewSet(viewsets.ViewSet):
             }
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
     
+    @swagger_auto_schema(request_body=BulkFavoriteSerializer, responses={200: 'OK', 400: 'BAD REQUEST'})
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """
+        Add and remove many favorites at once, e.g. when an offline client syncs.
+        """
+        serializer = BulkFavoriteSerializer(data=request.data)
+        if not serializer.is_valid():
+            response_data = {
+                "success": False,
+                "status": 400,
+                "message": "Validation error",
+                "errors": serializer.errors,
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            add = list(dict.fromkeys(serializer.validated_data['add']))
+            remove = list(dict.fromkeys(serializer.validated_data['remove']))
+            user_id = request.user.pk
+            existing = set(Property.objects.filter(pk__in=add).values_list('pk', flat=True)) if add else set()
+            favorited = set(Favorite.objects.filter(user_id=user_id, property_id__in=add + remove).values_list('property_id', flat=True))
+            with transaction.atomic():
+                Favorite.objects.bulk_create(
+                    [Favorite(user_id=user_id, property_id=pk) for pk in add if pk in existing and pk not in favorited],
+                    ignore_conflicts=True,
+                )
+                if remove:
+                    Favorite.objects.filter(user_id=user_id, property_id__in=remove).delete()
+            results = []
+            for pk in add:
+                result = 'not_found' if pk not in existing else 'already_favorited' if pk in favorited else 'added'
+                results.append({'property_id': pk, 'action': 'add', 'result': result})
+            for pk in remove:
+                result = 'removed' if pk in favorited else 'not_favorited'
+                results.append({'property_id': pk, 'action': 'remove', 'result': result})
+            response_data = {
+                "success": True,
+                "status": 200,
+                "message": "Favorites updated successfully",
+                "data": results
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+        except Exception as e:
+            general_logger.error("An error occurred: %s", e)
+            response_data = {
+                "success": False,
+                "status": 400,
+                "message": "Validation error: an error occured",
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
     @swagger_auto_schema(responses={204: 'NO CONTENT', 404: 'NOT FOUND'})
     def destroy(self, request, pk=None, *args, **kwargs):
         try:
             property = Property.objects.get(pk=pk)
-            user = request.user
-            favorite = Favorite.objects.get(user=user, property=property)
+            user_id = request.user.pk
+            favorite = Favorite.objects.get(user_id=user_id, property=property)
             favorite.delete()
             response_data = {
                 "success": True,
@@ -263,8 +536,8 @@ class EnquiryViewSet(viewsets.ViewSet):
                 email_body = serializer.validated_data['message']
                 email_recipient = ['test@peteroyelegbin.com.ng']
                 email_header = {'Reply-To': auth_user.email}
-                # Asynchronously handle send mail
-                Thread(target=send_async_email, args=(email_subject, email_body, email_recipient, email_header)).start()
+                with transaction.atomic():
+                    queue_email(email_subject, email_body, email_recipient, email_header)
                 response_data = {
                     "success": True,
                     "status": 200,
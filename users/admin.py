@@ -1,9 +1,22 @@
 from django.contrib import admin
-from .models import UserModel
+from utils import revoke_user_sessions
+from .models import UserModel, EmailOutbox
 
 # Register your models here.
 @admin.register(UserModel)
 class UserModelAdmin(admin.ModelAdmin):
     list_display = ("id", "email", "is_staff", "date_joined")
     list_filter = ("is_staff",)
-    
\ No newline at end of file
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A deactivated user is signed out everywhere, and a change of staff
+        # status must not linger in the is_staff claim of older tokens
+        if change and (('is_active' in form.changed_data and not obj.is_active) or 'is_staff' in form.changed_data):
+            revoke_user_sessions(obj.pk)
+    
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_on", "sent_on")
+    list_filter = ("status",)
@@ -0,0 +1,35 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils.timezone import now
+from users.models import EmailOutbox
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Measure outbox throughput against Django's locmem email backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        count = options['emails']
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'), transaction.atomic():
+            started = perf_counter()
+            EmailOutbox.objects.bulk_create([
+                EmailOutbox(subject=f'Benchmark {index}', body='Benchmark body', recipients=['benchmark@elbis.com'], next_attempt_at=now())
+                for index in range(count)
+            ])
+            queued = perf_counter() - started
+
+            started = perf_counter()
+            call_command('process_email_outbox', batch_size=options['batch_size'], verbosity=0)
+            sent = perf_counter() - started
+
+            delivered = EmailOutbox.objects.filter(status=EmailOutbox.SENT).count()
+            self.stdout.write(f"Queued {count} emails in {queued:.2f}s ({count / queued:.0f}/s)")
+            self.stdout.write(f"Delivered {delivered} emails in {sent:.2f}s ({delivered / sent:.0f}/s) with batches of {options['batch_size']}")
+            # Never keep the benchmark rows
+            transaction.set_rollback(True)
@@ -0,0 +1,42 @@
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from users.models import UserModel
+from utils import UserRefreshToken
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Measure signups per second on one core, with and without the second password hash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=20)
+
+    def handle(self, *args, **options):
+        count = options['signups']
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'), transaction.atomic():
+            started = perf_counter()
+            for index in range(count):
+                # The previous pipeline: create the user, then authenticate() hashes the password again
+                user = UserModel.objects.create_user(f'before{index}@benchmark.elbis.com', 'benchmark-password', first_name='Bench', last_name='Mark')
+                user = authenticate(username=user.email, password='benchmark-password')
+                UserRefreshToken.for_user(user)
+            before = perf_counter() - started
+
+            client = APIClient(HTTP_HOST='127.0.0.1')
+            started = perf_counter()
+            for index in range(count):
+                response = client.post('/v1/api/users/signup', {
+                    'email': f'after{index}@benchmark.elbis.com', 'password': 'benchmark-password', 'first_name': 'Bench', 'last_name': 'Mark',
+                })
+                if response.status_code != 201:
+                    self.stderr.write(f"Signup failed: {response.content}")
+                    break
+            after = perf_counter() - started
+
+            self.stdout.write(f"Before: {count} signups in {before:.2f}s ({count / before:.1f}/s per core)")
+            self.stdout.write(f"After:  {count} signups in {after:.2f}s ({count / after:.1f}/s per core)")
+            # Never keep the benchmark rows
+            transaction.set_rollback(True)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.provisioning import FORMATS, get_format, provision_users
+from time import perf_counter
+import sys
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or JSONL file with email, first_name, last_name and password"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Hashing processes, defaults to the number of cores")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or get_format(path)
+        if file_format is None:
+            raise CommandError("Cannot tell the format from the file name, pass --format")
+
+        started = perf_counter()
+        if path == '-':
+            result = provision_users(sys.stdin, file_format, options['batch_size'], options['workers'])
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = provision_users(stream, file_format, options['batch_size'], options['workers'])
+        elapsed = perf_counter() - started
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']} ({error['email']}): {error['errors']}")
+        self.stdout.write(f"Created {result['created']} users in {elapsed:.2f}s, {result['failed']} rows failed")
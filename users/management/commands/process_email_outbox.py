@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from django.core.mail import get_connection
+from django.db import transaction
+from django.conf import settings
+from django.utils.timezone import now
+from datetime import timedelta
+from users.models import EmailOutbox
+from utils import email_logger
+import time
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox emails in batches, one SMTP connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new emails instead of exiting when the outbox is empty")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to sleep between polls when looping")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = self.process_batch(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        if options['verbosity'] > 0:
+            self.stdout.write(f"Processed {total} outbox emails")
+
+    def process_batch(self, batch_size):
+        """
+        Claim up to `batch_size` due emails with SELECT ... FOR UPDATE SKIP LOCKED,
+        so several workers can run side by side, then send them over one
+        connection, saving each outcome as soon as it is known. The claim
+        keeps the worker pool from sending the same emails meanwhile.
+        """
+        with transaction.atomic():
+            rows = list(
+                EmailOutbox.unclaimed().select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now())
+                .order_by('next_attempt_at')[:batch_size]
+            )
+            if not rows:
+                return 0
+            EmailOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(claimed_at=now())
+
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            email_logger.error(f"Error opening email connection: {e}")
+            for row in rows:
+                self.record_failure(row, e)
+                self.save(row)
+            return len(rows)
+        for row in rows:
+            try:
+                connection.send_messages([row.to_message()])
+                row.status = EmailOutbox.SENT
+                row.sent_on = now()
+            except Exception as e:
+                email_logger.error(f"Error sending email: {e}")
+                self.record_failure(row, e)
+            self.save(row)
+        connection.close()
+        return len(rows)
+
+    def save(self, row):
+        row.claimed_at = None
+        row.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'claimed_at', 'sent_on'])
+
+    def record_failure(self, row, error):
+        # Exponential backoff: BACKOFF, 2 x BACKOFF, 4 x BACKOFF, ... capped at an hour
+        row.attempts += 1
+        row.last_error = str(error)
+        if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            row.status = EmailOutbox.FAILED
+        delay = min(settings.EMAIL_OUTBOX_BACKOFF * 2 ** (row.attempts - 1), 3600)
+        row.next_attempt_at = now() + timedelta(seconds=delay)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils.timezone import now
+from django_rest_passwordreset.models import ResetPasswordToken
+from datetime import timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = "Delete expired password reset tokens in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping instead of exiting once no expired tokens are left")
+        parser.add_argument('--interval', type=float, default=300, help="Seconds to sleep between sweeps when looping")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            deleted = self.purge_batch(options['batch_size'])
+            total += deleted
+            if deleted:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        if options['verbosity'] > 0:
+            self.stdout.write(f"Deleted {total} expired reset tokens")
+
+    def purge_batch(self, batch_size):
+        """
+        Pick the oldest expired tokens through the created_at index and delete
+        them by primary key, keeping each transaction short.
+        """
+        cutoff = now() - timedelta(seconds=settings.PASSWORD_RESET_OTP_TIMEOUT)
+        pks = list(
+            ResetPasswordToken.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return 0
+        ResetPasswordToken.objects.filter(pk__in=pks).delete()
+        return len(pks)
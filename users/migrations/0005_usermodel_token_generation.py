@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='token_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
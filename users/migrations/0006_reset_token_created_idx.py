@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['created_at'], name='reset_token_created_idx')
+
+
+def add_created_index(apps, schema_editor):
+    """
+    Index the third-party reset token table on created_at so that
+    purge_reset_tokens can delete expired rows with a range scan.
+    """
+    ResetPasswordToken = apps.get_model('django_rest_passwordreset', 'ResetPasswordToken')
+    schema_editor.add_index(ResetPasswordToken, INDEX)
+
+
+def remove_created_index(apps, schema_editor):
+    ResetPasswordToken = apps.get_model('django_rest_passwordreset', 'ResetPasswordToken')
+    schema_editor.remove_index(ResetPasswordToken, INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_usermodel_token_generation'),
+        ('django_rest_passwordreset', '0004_alter_resetpasswordtoken_user_agent'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_created_index, remove_created_index),
+    ]
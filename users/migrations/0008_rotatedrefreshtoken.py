@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+        ('users', '0007_user_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RotatedRefreshToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rotated_on', models.DateTimeField(auto_now_add=True)),
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='token_blacklist.outstandingtoken')),
+            ],
+        ),
+    ]
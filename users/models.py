@@ -1,11 +1,14 @@
 from django.db import models
 from django.utils.timezone import now
 from django.contrib.auth.models import AbstractUser
+from django.core.mail import EmailMultiAlternatives
+from django.conf import settings
 from django_rest_passwordreset.models import ResetPasswordToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from uuid import uuid4
 from datetime import timedelta
 from .utils import UserModelManager
-import random
+import secrets
 
 
 # Create your models here.
@@ -18,6 +21,8 @@ class UserModel(AbstractUser):
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
     email = models.EmailField(max_length=255, unique=True)
+    # Embedded in access tokens; bumping it invalidates every token issued before
+    token_generation = models.PositiveIntegerField(default=0)
     
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ['first_name', 'last_name',]
@@ -29,6 +34,11 @@ class UserModel(AbstractUser):
 
     class Meta:
         ordering = ['-date_joined']
+        indexes = [
+            # Keyset pagination of the user listing, optionally by staff flag
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_id_idx'),
+            models.Index(fields=['is_staff', '-date_joined', '-id'], name='user_staff_joined_idx'),
+        ]
 
 
 class CustomPasswordResetToken(ResetPasswordToken):
@@ -43,12 +53,92 @@ class CustomPasswordResetToken(ResetPasswordToken):
         """
         Override the generate_key method to generate a 6-digit OTP.
         """
-        return f"{random.randint(100000, 999999)}"
+        return f"{secrets.randbelow(900000) + 100000}"
 
     def is_expired(self):
         """
         Check if the OTP has expired.
         """
-        expiration_time = timedelta(minutes=10) #Set expiration duration to 10 minutes
+        expiration_time = timedelta(seconds=settings.PASSWORD_RESET_OTP_TIMEOUT)
         return now() > self.created_at + expiration_time
-    
\ No newline at end of file
+    
+
+class RevokedToken(models.Model):
+    """
+    Access tokens revoked before they expire, shared by every worker. Rows are
+    only needed until `expires_at`, after which the token is rejected anyway.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class RotatedRefreshToken(models.Model):
+    """
+    Refresh tokens blacklisted because they were exchanged for a new pair.
+    Only these count as reuse when presented again; tokens blacklisted by a
+    logout or password reset are merely rejected. flushexpiredtokens deletes
+    the rows along with their outstanding tokens.
+    """
+    token = models.OneToOneField(OutstandingToken, on_delete=models.CASCADE)
+    rotated_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.token.jti
+
+
+class EmailOutbox(models.Model):
+    """
+    Durable outbox for emails. Rows are written in the request transaction and
+    delivered by the email worker pool or the process_email_outbox command.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(default=uuid4, unique=True, primary_key=True, editable=False)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipients = models.JSONField()
+    headers = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_on']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+    @classmethod
+    def unclaimed(cls):
+        """
+        Pending rows no sender is working on. A claim older than
+        EMAIL_OUTBOX_CLAIM_TIMEOUT belongs to a sender that died.
+        """
+        stale = now() - timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+        return cls.objects.filter(models.Q(claimed_at__isnull=True) | models.Q(claimed_at__lte=stale), status=cls.PENDING)
+
+    @classmethod
+    def claim(cls, pk):
+        """
+        Claim a row for sending; False when it was sent or claimed already.
+        """
+        return cls.unclaimed().filter(pk=pk).update(claimed_at=now()) == 1
+
+    def to_message(self):
+        message = EmailMultiAlternatives(self.subject, self.body, settings.DEFAULT_FROM_EMAIL, self.recipients, headers=self.headers)
+        message.outbox_id = self.pk
+        return message
@@ -0,0 +1,109 @@
+"""
+One-time codes for password resets.
+
+With the cache store, codes live in the shared cache and expire through its
+native TTL, so a reset costs no database writes. The database store keeps
+CustomPasswordResetToken rows; purge_reset_tokens sweeps the expired ones.
+Confirmations are throttled per client by the view. When a confirmation
+names the account, wrong codes count against that account's code, which is
+revoked after PASSWORD_RESET_MAX_ATTEMPTS so it cannot be guessed; the user
+then asks for a new one.
+"""
+from django.core.cache import cache
+from django.conf import settings
+from .models import UserModel, CustomPasswordResetToken
+
+OTP_KEY = 'auth:otp:{}'
+USER_OTP_KEY = 'auth:otp:user:{}'
+ATTEMPTS_KEY = 'auth:otp:attempts:{}'
+
+
+class InvalidOTP(Exception):
+    pass
+
+
+class ExpiredOTP(InvalidOTP):
+    pass
+
+
+def issue_otp(user):
+    """
+    Return the user's current reset code, creating one if needed.
+    """
+    if settings.PASSWORD_RESET_OTP_STORE == 'database':
+        token, _ = CustomPasswordResetToken.objects.get_or_create(user=user)
+        if token.is_expired():
+            token.delete()
+            token = CustomPasswordResetToken.objects.create(user=user)
+        return token.key
+
+    timeout = settings.PASSWORD_RESET_OTP_TIMEOUT
+    code = cache.get(USER_OTP_KEY.format(user.pk))
+    if code and cache.get(OTP_KEY.format(code)) == str(user.pk):
+        return code
+    # Codes are looked up on their own, so two users must never hold the same one
+    for _ in range(10):
+        code = CustomPasswordResetToken.generate_key()
+        if cache.add(OTP_KEY.format(code), str(user.pk), timeout=timeout):
+            cache.set(USER_OTP_KEY.format(user.pk), code, timeout=timeout)
+            return code
+    raise RuntimeError("Could not allocate a unique reset code")
+
+
+def consume_otp(code, email=None):
+    """
+    Return the user the code was issued to and invalidate the code. With an
+    email the code must belong to that account. Raises InvalidOTP or ExpiredOTP.
+    """
+    if settings.PASSWORD_RESET_OTP_STORE == 'database':
+        token = CustomPasswordResetToken.objects.select_related('user').filter(key=code).first()
+        if token is None or not owns_code(token.user, email):
+            record_failure(email)
+            raise InvalidOTP
+        token.delete()
+        if token.is_expired():
+            raise ExpiredOTP
+        return token.user
+
+    key = OTP_KEY.format(code)
+    user_id = cache.get(key)
+    user = user_id and UserModel.objects.filter(pk=user_id).first()
+    if not user or not owns_code(user, email):
+        record_failure(email)
+        raise InvalidOTP
+    cache.delete_many([key, USER_OTP_KEY.format(user_id), ATTEMPTS_KEY.format(user_id)])
+    return user
+
+
+def owns_code(user, email):
+    return email is None or user.email.lower() == email.lower()
+
+
+def revoke_otp(user):
+    if settings.PASSWORD_RESET_OTP_STORE == 'database':
+        CustomPasswordResetToken.objects.filter(user=user).delete()
+        return
+    code = cache.get(USER_OTP_KEY.format(user.pk))
+    keys = [USER_OTP_KEY.format(user.pk), ATTEMPTS_KEY.format(user.pk)]
+    if code and cache.get(OTP_KEY.format(code)) == str(user.pk):
+        keys.append(OTP_KEY.format(code))
+    cache.delete_many(keys)
+
+
+def record_failure(email):
+    """
+    Count a wrong code against the named account, revoking its code once
+    PASSWORD_RESET_MAX_ATTEMPTS is reached.
+    """
+    user = email and UserModel.objects.filter(email=email).first()
+    if not user:
+        return
+    attempts_key = ATTEMPTS_KEY.format(user.pk)
+    # Counted for as long as a code lives
+    cache.add(attempts_key, 0, timeout=settings.PASSWORD_RESET_OTP_TIMEOUT)
+    try:
+        attempts = cache.incr(attempts_key)
+    except ValueError:
+        return
+    if attempts >= settings.PASSWORD_RESET_MAX_ATTEMPTS:
+        revoke_otp(user)
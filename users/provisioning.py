@@ -0,0 +1,149 @@
+"""
+Bulk user provisioning from CSV or JSONL.
+
+Rows are read lazily and handled in batches: each batch is validated, its
+passwords are hashed in a process pool across all cores, and it is written
+with a single bulk_create. Invalid rows are reported with their line number
+and never stop the run.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import transaction, IntegrityError
+from functools import partial
+from .models import UserModel
+from .serializers import ProvisionUserSerializer
+from .workers import setup_worker
+import csv, io, json, multiprocessing, os
+
+FORMATS = ('csv', 'jsonl')
+
+
+def get_format(filename):
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return 'jsonl' if extension in ('jsonl', 'ndjson') else 'csv' if extension == 'csv' else None
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (line, row) from a text stream; row is None for an unparsable line.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+        yield line, row if isinstance(row, dict) else None
+
+
+def open_upload(upload):
+    # Uploaded files are binary; decode them as they are read instead of loading them whole
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+
+
+class UserProvisioner:
+    def __init__(self, batch_size=500, workers=None):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.created = 0
+        self.errors = []
+        self.seen = set()
+
+    def run(self, rows):
+        with self.get_executor() as executor:
+            self.executor = executor
+            batch = []
+            for line, row in rows:
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self.process_batch(batch)
+                    batch = []
+            if batch:
+                self.process_batch(batch)
+        errors = sorted(self.errors, key=lambda error: error['line'])
+        return {'created': self.created, 'failed': len(errors), 'errors': errors}
+
+    def get_executor(self):
+        # Spawned rather than forked: the caller may be a web worker running other
+        # threads (e.g. the email pool) whose locks and database connection a fork copies
+        if self.workers > 1:
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=setup_worker)
+        return SerialExecutor()
+
+    def process_batch(self, batch):
+        valid = []
+        for line, row in batch:
+            if row is None:
+                self.add_error(line, None, {'row': ['Could not parse this row']})
+                continue
+            serializer = ProvisionUserSerializer(data=row)
+            if not serializer.is_valid():
+                self.add_error(line, row.get('email'), serializer.errors)
+                continue
+            data = serializer.validated_data
+            data['email'] = UserModel.objects.normalize_email(data['email'])
+            key = data['email'].lower()
+            if key in self.seen:
+                self.add_error(line, data['email'], {'email': ['Duplicate email in this file']})
+                continue
+            self.seen.add(key)
+            valid.append((line, data))
+
+        existing = set(
+            email.lower() for email in
+            UserModel.objects.filter(email__in=[data['email'] for _, data in valid]).values_list('email', flat=True)
+        )
+        pending = []
+        for line, data in valid:
+            if data['email'].lower() in existing:
+                self.add_error(line, data['email'], {'email': ['User with this email already exists']})
+            else:
+                pending.append((line, data))
+        if not pending:
+            return
+
+        chunksize = max(len(pending) // (self.workers * 4), 1)
+        # Name the hasher, which the workers would otherwise pick from their own settings
+        hash_password = partial(make_password, hasher=get_hasher().algorithm)
+        hashes = self.executor.map(hash_password, [data['password'] for _, data in pending], chunksize=chunksize)
+        users = [
+            UserModel(email=data['email'], first_name=data['first_name'], last_name=data['last_name'], password=password)
+            for (_, data), password in zip(pending, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                UserModel.objects.bulk_create(users, batch_size=self.batch_size)
+            self.created += len(users)
+        except IntegrityError:
+            # Someone else created one of these emails meanwhile; find it row by row
+            for (line, data), user in zip(pending, users):
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    self.created += 1
+                except IntegrityError:
+                    self.add_error(line, data['email'], {'email': ['User with this email already exists']})
+
+    def add_error(self, line, email, errors):
+        self.errors.append({'line': line, 'email': email, 'errors': errors})
+
+
+class SerialExecutor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, function, items, chunksize=1):
+        return map(function, items)
+
+
+def provision_users(stream, file_format, batch_size=500, workers=None):
+    return UserProvisioner(batch_size=batch_size, workers=workers).run(read_rows(stream, file_format))
@@ -28,4 +28,16 @@ class ResetPasswordSerializer(serializers.Serializer):
 
 class ConfirmPasswordSerializer(serializers.Serializer):
     token = serializers.CharField()
+    email = serializers.EmailField(required=False)
+    password = serializers.CharField(min_length=6)
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField()
+
+
+class ProvisionUserSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=255)
+    first_name = serializers.CharField(max_length=255)
+    last_name = serializers.CharField(max_length=255)
     password = serializers.CharField(min_length=6)
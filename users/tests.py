@@ -1,3 +1,387 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils.timezone import now
+from datetime import timedelta
+from unittest import mock
+from rest_framework.test import APIClient, APIRequestFactory
+from django.core import mail
+from django.core.mail import EmailMessage
+from utils import BloomFilter, EmailDispatcher, UserAccessToken, ClaimsUser, CustomJWTAuthentication, token_revocations
+from .models import UserModel, RevokedToken, EmailOutbox, CustomPasswordResetToken
+from .otp import issue_otp
+from .provisioning import provision_users
+import io, json, threading
 
 # Create your tests here.
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user('revoke@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.token = UserAccessToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        token_revocations.reset()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f'jti-{index}')
+        self.assertTrue(all(f'jti-{index}' in bloom for index in range(1000)))
+
+    def test_logout_revokes_token_until_expiry(self):
+        response = self.client.post('/v1/api/users/logout')
+        self.assertEqual(response.status_code, 205)
+        revoked = RevokedToken.objects.get(jti=self.token['jti'])
+        self.assertEqual(int(revoked.expires_at.timestamp()), self.token['exp'])
+        self.assertEqual(self.client.post('/v1/api/users/logout').status_code, 401)
+
+    def test_revocation_from_another_worker(self):
+        # A fresh filter stands in for a different process that only sees the table
+        RevokedToken.objects.create(jti=self.token['jti'], expires_at=now() + timedelta(hours=1))
+        token_revocations.reset()
+        self.assertEqual(self.client.post('/v1/api/users/logout').status_code, 401)
+
+    def test_rebuild_keeps_serving_the_previous_filter(self):
+        RevokedToken.objects.create(jti=self.token['jti'], expires_at=now() + timedelta(hours=1))
+        token_revocations.sync()
+        token_revocations.built_at -= timedelta(seconds=settings.TOKEN_REVOCATION_REBUILD_INTERVAL)
+        token_revocations.synced_at -= timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_INTERVAL)
+        # What a concurrent is_revoked() would see while the new filter is filled
+        seen = []
+
+        def add(bloom, jti):
+            seen.append(self.token['jti'] in token_revocations.filter)
+            original_add(bloom, jti)
+
+        original_add = BloomFilter.add
+        with mock.patch.object(BloomFilter, 'add', autospec=True, side_effect=add):
+            token_revocations.sync()
+        self.assertEqual(seen, [True])
+        self.assertTrue(token_revocations.is_revoked(self.token['jti']))
+
+    def test_unrevoked_token_skips_lookup(self):
+        token_revocations.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(token_revocations.is_revoked(self.token['jti']))
+
+
+class TokenGenerationTests(TestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user('sessions@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.clients = []
+        for _ in range(2):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(self.user)}')
+            self.clients.append(client)
+
+    def test_logout_all_invalidates_every_session(self):
+        response = self.clients[0].post('/v1/api/users/logout/all')
+        self.assertEqual(response.status_code, 205)
+        for client in self.clients:
+            self.assertEqual(client.post('/v1/api/users/logout').status_code, 401)
+
+        self.user.refresh_from_db()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(self.user)}')
+        self.assertEqual(client.post('/v1/api/users/logout').status_code, 205)
+
+    def test_password_reset_invalidates_sessions(self):
+        token = CustomPasswordResetToken.objects.create(user=self.user)
+        response = APIClient().post('/v1/api/users/password/confirm', {'email': self.user.email, 'token': token.key, 'password': 'new-password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.clients[0].post('/v1/api/users/logout').status_code, 401)
+
+
+class StatelessUserTests(TestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user('claims@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(self.user)}')
+        token_revocations.reset()
+
+    def test_user_is_built_from_claims(self):
+        authentication = CustomJWTAuthentication()
+        authentication.authenticate(self.request)
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate(self.request)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.email, str(user)), (str(self.user.pk), self.user.email, 'Ada Obi'))
+        self.assertEqual(user.get_instance(), self.user)
+
+
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        UserModel.objects.create_user('refresh@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.client = APIClient()
+        self.tokens = self.client.post('/v1/api/users/login', {'email': 'refresh@elbis.com', 'password': 'password'}).json()
+
+    def refresh(self, refresh_token):
+        return self.client.post('/v1/api/users/token/refresh', {'refresh_token': refresh_token})
+
+    def logout(self, access_token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        return client.post('/v1/api/users/logout')
+
+    def test_refresh_rotates_token(self):
+        response = self.refresh(self.tokens['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()
+        self.assertNotEqual(rotated['refresh_token'], self.tokens['refresh_token'])
+        self.assertEqual(self.logout(rotated['access_token']).status_code, 205)
+
+    def test_reused_refresh_token_revokes_all_sessions(self):
+        rotated = self.refresh(self.tokens['refresh_token']).json()
+        self.assertEqual(self.refresh(self.tokens['refresh_token']).status_code, 401)
+        self.assertEqual(self.refresh(rotated['refresh_token']).status_code, 401)
+        self.assertEqual(self.logout(rotated['access_token']).status_code, 401)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        response = self.client.post('/v1/api/users/token/revoke', {'refresh_token': self.tokens['refresh_token']})
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.refresh(self.tokens['refresh_token']).status_code, 401)
+
+    def test_stale_refresh_after_logout_all_spares_new_sessions(self):
+        laptop = self.tokens
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {laptop['access_token']}")
+        self.assertEqual(client.post('/v1/api/users/logout/all').status_code, 205)
+        phone = self.client.post('/v1/api/users/login', {'email': 'refresh@elbis.com', 'password': 'password'}).json()
+
+        self.assertEqual(self.refresh(laptop['refresh_token']).status_code, 401)
+        response = self.refresh(phone['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.logout(response.json()['access_token']).status_code, 205)
+
+
+class SignUpTests(TestCase):
+    def test_signup_issues_tokens_and_queues_welcome_email(self):
+        data = {'email': 'new@elbis.com', 'password': 'password', 'first_name': 'Ada', 'last_name': 'Obi'}
+        response = APIClient().post('/v1/api/users/signup', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('refresh_token', response.json())
+        self.assertEqual(EmailOutbox.objects.get().recipients, ['new@elbis.com'])
+
+
+class EmailDispatcherTests(TestCase):
+    def message(self, index=0):
+        return EmailMessage(f'Subject {index}', 'Body', 'noreply@elbis.com', ['dispatch@elbis.com'])
+
+    @override_settings(EMAIL_WORKERS=1, EMAIL_QUEUE_SIZE=2, EMAIL_QUEUE_TIMEOUT=0.01, EMAIL_BATCH_SIZE=1)
+    def test_full_queue_rejects_emails(self):
+        dispatcher = EmailDispatcher()
+        sending = threading.Event()
+        release = threading.Event()
+
+        def send_batch(batch):
+            sending.set()
+            release.wait(5)
+
+        with mock.patch.object(dispatcher, 'send_batch', side_effect=send_batch):
+            # The worker holds the first email, two more fill the queue
+            self.assertTrue(dispatcher.submit(self.message(0)))
+            self.assertTrue(sending.wait(5))
+            self.assertTrue(dispatcher.submit(self.message(1)))
+            self.assertTrue(dispatcher.submit(self.message(2)))
+            self.assertFalse(dispatcher.submit(self.message(3)))
+            metrics = dispatcher.get_metrics()
+            self.assertEqual((metrics['queued'], metrics['rejected'], metrics['queue_depth']), (3, 1, 2))
+            release.set()
+            dispatcher.shutdown(timeout=5)
+
+    @override_settings(EMAIL_WORKERS=1, EMAIL_BATCH_SIZE=5)
+    def test_shutdown_sends_queued_emails(self):
+        dispatcher = EmailDispatcher()
+        for index in range(3):
+            dispatcher.submit(self.message(index))
+        dispatcher.shutdown(timeout=5)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(dispatcher.get_metrics()['sent'], 3)
+
+    def test_partly_failed_batch_marks_each_sent_email(self):
+        rows = [EmailOutbox.objects.create(subject=f'Subject {index}', body='Body', recipients=['dispatch@elbis.com']) for index in range(3)]
+        send_messages = mail.get_connection().send_messages
+
+        def fail_second(messages):
+            if messages[0].subject == 'Subject 1':
+                raise OSError('refused')
+            return send_messages(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=fail_second):
+            EmailDispatcher().send_batch([row.to_message() for row in rows])
+        statuses = dict(EmailOutbox.objects.values_list('subject', 'status'))
+        self.assertEqual(statuses, {'Subject 0': EmailOutbox.SENT, 'Subject 1': EmailOutbox.PENDING, 'Subject 2': EmailOutbox.SENT})
+
+
+class EmailOutboxTests(TestCase):
+    def add_email(self, **kwargs):
+        return EmailOutbox.objects.create(subject='Welcome', body='Body', recipients=['outbox@elbis.com'], **kwargs)
+
+    def test_drain_sends_due_emails(self):
+        due = [self.add_email() for _ in range(3)]
+        later = self.add_email(next_attempt_at=now() + timedelta(minutes=5))
+        call_command('process_email_outbox', batch_size=2, verbosity=0)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(set(EmailOutbox.objects.filter(status=EmailOutbox.SENT).values_list('pk', flat=True)), {email.pk for email in due})
+        later.refresh_from_db()
+        self.assertEqual(later.status, EmailOutbox.PENDING)
+
+    @override_settings(EMAIL_OUTBOX_BACKOFF=30, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_sends_back_off_then_fail(self):
+        email = self.add_email()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('refused')):
+            call_command('process_email_outbox', verbosity=0)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.PENDING, 1, 'refused'))
+            self.assertGreater(email.next_attempt_at, now() + timedelta(seconds=20))
+
+            EmailOutbox.objects.filter(pk=email.pk).update(next_attempt_at=now())
+            call_command('process_email_outbox', verbosity=0)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (EmailOutbox.FAILED, 2))
+        self.assertEqual(mail.outbox, [])
+
+    def test_claimed_emails_are_sent_once(self):
+        # The worker pool is still sending this one after the grace period
+        in_flight = self.add_email(next_attempt_at=now())
+        self.assertTrue(EmailOutbox.claim(in_flight.pk))
+        call_command('process_email_outbox', verbosity=0)
+        self.assertEqual(mail.outbox, [])
+
+        # ...and the command already sent this one when the pool gets to it
+        sent = self.add_email(next_attempt_at=now())
+        call_command('process_email_outbox', verbosity=0)
+        EmailDispatcher().send_batch([sent.to_message()])
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_OUTBOX_CLAIM_TIMEOUT=60)
+    def test_abandoned_claims_are_retried(self):
+        email = self.add_email(claimed_at=now() - timedelta(minutes=2))
+        call_command('process_email_outbox', verbosity=0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.claimed_at), (EmailOutbox.SENT, None))
+
+
+class ProvisioningTests(TestCase):
+    def test_bulk_import_reports_row_errors(self):
+        UserModel.objects.create_user('taken@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        admin = UserModel.objects.create_user('admin@elbis.com', 'password', first_name='Ada', last_name='Obi', is_staff=True)
+        rows = [
+            'email,first_name,last_name,password',
+            'one@elbis.com,Ada,Obi,password',
+            'two@elbis.com,Ada,Obi,password',
+            'taken@elbis.com,Ada,Obi,password',
+            'not-an-email,Ada,Obi,password',
+            'one@elbis.com,Ada,Obi,password',
+        ]
+        upload = SimpleUploadedFile('users.csv', '\n'.join(rows).encode(), content_type='text/csv')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.post('/v1/api/users/manage/bulk', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [4, 5, 6])
+        self.assertTrue(UserModel.objects.get(email='two@elbis.com').check_password('password'))
+
+    def test_passwords_are_hashed_in_spawned_workers(self):
+        rows = ['email,first_name,last_name,password'] + [f'user{index}@elbis.com,Ada,Obi,password{index}' for index in range(4)]
+        result = provision_users(io.StringIO('\n'.join(rows)), 'csv', batch_size=4, workers=2)
+        self.assertEqual(result['created'], 4)
+        self.assertTrue(UserModel.objects.get(email='user3@elbis.com').check_password('password3'))
+
+
+@override_settings(PASSWORD_RESET_OTP_STORE='cache')
+class PasswordResetOTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserModel.objects.create_user('otp@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.client = APIClient()
+
+    def confirm(self, token, email=None, address='10.0.0.1'):
+        data = {'token': token, 'password': 'new-password'}
+        if email:
+            data['email'] = email
+        return self.client.post('/v1/api/users/password/confirm', data, REMOTE_ADDR=address)
+
+    def test_cache_code_resets_password_once(self):
+        code = issue_otp(self.user)
+        self.assertEqual(issue_otp(self.user), code)
+        self.assertFalse(CustomPasswordResetToken.objects.exists())
+        self.assertEqual(self.confirm(code).status_code, 200)
+        self.assertEqual(self.confirm(code).status_code, 400)
+
+    def test_failed_attempts_revoke_the_code(self):
+        code = issue_otp(self.user)
+        wrong = '100000' if code != '100000' else '100001'
+        for index in range(settings.PASSWORD_RESET_MAX_ATTEMPTS):
+            # A different client address per attempt does not reset the count
+            self.assertEqual(self.confirm(wrong, self.user.email, f'10.0.0.{index}').status_code, 400)
+        self.assertEqual(self.confirm(code, self.user.email, '10.0.1.1').status_code, 400)
+
+        # The account is not locked out: a freshly issued code still works
+        self.assertEqual(self.confirm(issue_otp(self.user), self.user.email, '10.0.1.2').status_code, 200)
+
+    def test_code_only_works_for_its_account(self):
+        code = issue_otp(self.user)
+        UserModel.objects.create_user('other@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        self.assertEqual(self.confirm(code, 'other@elbis.com').status_code, 400)
+        self.assertEqual(self.confirm(code, self.user.email).status_code, 200)
+
+    def test_confirmations_are_throttled_per_client(self):
+        code = issue_otp(self.user)
+        wrong = '100000' if code != '100000' else '100001'
+        for index in range(10):
+            self.assertEqual(self.confirm(wrong).status_code, 400)
+        response = self.confirm(code)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.confirm(code, address='10.0.0.2').status_code, 200)
+
+    def test_purge_deletes_only_expired_rows(self):
+        expired = CustomPasswordResetToken.objects.create(user=self.user)
+        CustomPasswordResetToken.objects.filter(pk=expired.pk).update(created_at=now() - timedelta(hours=1))
+        other = UserModel.objects.create_user('fresh@elbis.com', 'password', first_name='Ada', last_name='Obi')
+        fresh = CustomPasswordResetToken.objects.create(user=other)
+        call_command('purge_reset_tokens', batch_size=1, verbosity=0)
+        self.assertEqual(list(CustomPasswordResetToken.objects.values_list('pk', flat=True)), [fresh.pk])
+
+
+class UserListTests(TestCase):
+    def setUp(self):
+        for index in range(5):
+            UserModel.objects.create_user(f'user{index}@elbis.com', 'password', first_name='Ada', last_name='Obi', is_staff=index == 0)
+        self.client = APIClient()
+
+    def test_paginated_walk_without_password_column(self):
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get('/v1/api/users/manage', params).json()
+            self.assertNotIn('password', queries[0]['sql'])
+            seen += [user['email'] for user in data['data']]
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_filters(self):
+        data = self.client.get('/v1/api/users/manage', {'email': 'USER1'}).json()['data']
+        self.assertEqual([user['email'] for user in data], ['user1@elbis.com'])
+        data = self.client.get('/v1/api/users/manage', {'is_staff': 'true'}).json()['data']
+        self.assertEqual([user['email'] for user in data], ['user0@elbis.com'])
+        self.assertEqual(self.client.get('/v1/api/users/manage', {'is_staff': 'maybe'}).status_code, 400)
+
+    @override_settings(STREAM_CHUNK_SIZE=2)
+    def test_stream_returns_every_user(self):
+        response = self.client.get('/v1/api/users/manage', {'stream': 'true'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['message'], 'Users retrieved successfully')
+        self.assertEqual(len(data['data']), 5)
+        self.assertEqual(len({user['email'] for user in data['data']}), 5)
+        self.assertNotIn('next', data)
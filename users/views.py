@@ -1,14 +1,32 @@
+import math
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import ValidationError, Throttled
+from rest_framework.throttling import ScopedRateThrottle
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.conf import settings
 from drf_yasg.utils import swagger_auto_schema
-from datetime import timedelta
-from threading import Thread
-from utils import CustomJWTAuthentication, send_async_email, cache, general_logger
-from .serializers import SignUpSerializer, LogInSerializer, ResetPasswordSerializer, ConfirmPasswordSerializer
-from .models import UserModel, CustomPasswordResetToken
+from drf_yasg import openapi
+from rest_framework_simplejwt.exceptions import TokenError
+from utils import KeysetPagination, UserRefreshToken, stream_list, wants_stream, queue_email, revoke_token, rotate_refresh_token, revoke_user_sessions, general_logger
+from .serializers import SignUpSerializer, LogInSerializer, ResetPasswordSerializer, ConfirmPasswordSerializer, RefreshTokenSerializer
+from .models import UserModel
+from .otp import issue_otp, consume_otp, InvalidOTP, ExpiredOTP
+from .provisioning import get_format, open_upload, provision_users
+
+USER_LIST_FIELDS = ('id', 'first_name', 'last_name', 'email', 'is_staff', 'date_joined')
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class UserPagination(KeysetPagination):
+    # Always paginated, unlike the opt-in property and favorite listings
+    opt_in = False
+    page_size = 50
+
 
 # Create your views here.
 class UsersView(viewsets.ViewSet):
@@ -18,6 +36,7 @@ class UsersView(viewsets.ViewSet):
     Manage all registered users. 
     """
     serializer_class = SignUpSerializer
+    pagination_class = UserPagination
     
     def get_permissions(self):
         """
@@ -29,18 +48,49 @@ class UsersView(viewsets.ViewSet):
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
 
-    @swagger_auto_schema(responses={200: 'OK', 204: 'NO CONTENT', 500: 'SERVER ERROR'})
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('email', openapi.IN_QUERY, description="Only users whose email starts with this prefix", type=openapi.TYPE_STRING),
+        openapi.Parameter('is_staff', openapi.IN_QUERY, description="Filter by staff flag", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the next or previous field of a previous response", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Users per page (default 50, max 100)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every matching user in one unpaginated response", type=openapi.TYPE_BOOLEAN),
+    ], responses={200: 'OK', 204: 'NO CONTENT', 400: 'BAD REQUEST', 500: 'SERVER ERROR'})
     def list(self, request):
         try:
-            queryset = UserModel.objects.all()
-            serializer = self.serializer_class(queryset, many=True)
+            # Newest first by (date_joined, id), reading only the columns the serializer outputs
+            queryset = UserModel.objects.only(*USER_LIST_FIELDS)
+            email = request.query_params.get('email')
+            if email:
+                queryset = queryset.filter(email__istartswith=email)
+            is_staff = request.query_params.get('is_staff')
+            if is_staff is not None:
+                if is_staff.lower() not in BOOLEAN_VALUES:
+                    raise ValidationError('is_staff must be true or false')
+                queryset = queryset.filter(is_staff=BOOLEAN_VALUES[is_staff.lower()])
+            if wants_stream(request):
+                return stream_list(queryset, self.serializer_class(), {
+                    'success': True,
+                    'status': 200,
+                    'message': 'Users retrieved successfully',
+                })
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = self.serializer_class(page, many=True)
             response_data = {
                 'success': True,
                 'status': 200,
                 'message': 'Users retrieved successfully',
+                **paginator.get_cursors(),
                 'data': serializer.data
             }
             return Response(response_data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            response_data = {
+                'success': False,
+                'status': 400,
+                'message': e.detail[0],
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         except UserModel.DoesNotExist:
             response_data = {
                 'success': True,
@@ -83,6 +133,42 @@ class UsersView(viewsets.ViewSet):
                 'message': 'An error occurred while deleting user',
             }
             return Response(response_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, description="CSV or JSONL file with email, first_name, last_name and password", type=openapi.TYPE_FILE, required=True),
+    ], responses={200: 'OK', 400: 'BAD REQUEST', 500: 'SERVER ERROR'})
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=(MultiPartParser, FormParser))
+    def bulk(self, request):
+        """
+        Create users in bulk from an uploaded CSV or JSONL file. Invalid rows
+        are reported per line and do not stop the import.
+        """
+        upload = request.FILES.get('file')
+        file_format = get_format(upload.name) if upload else None
+        if file_format is None:
+            response_data = {
+                'success': False,
+                'status': 400,
+                'message': 'Upload a .csv or .jsonl file in the file field',
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = provision_users(open_upload(upload), file_format)
+            response_data = {
+                'success': True,
+                'status': 200,
+                'message': f"{result['created']} users created, {result['failed']} rows failed",
+                'data': result
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+        except Exception as e:
+            general_logger.error("An error occurred: %s", e)
+            response_data = {
+                'success': False,
+                'status': 500,
+                'message': 'An error occurred while importing users',
+            }
+            return Response(response_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 
 class SignUpView(viewsets.ViewSet):
@@ -94,33 +180,28 @@ class SignUpView(viewsets.ViewSet):
     serializer_class = SignUpSerializer
     permission_classes = [AllowAny]
 
-    @swagger_auto_schema(request_body=SignUpSerializer, responses={201: 'CREATED', 400: 'BAD REQUEST', 401: 'UNAUTHORIZED'})
+    @swagger_auto_schema(request_body=SignUpSerializer, responses={201: 'CREATED', 400: 'BAD REQUEST'})
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
-            serializer.save()
-            email = serializer.validated_data.get('email')
-            password = serializer.validated_data.get('password')
-            user = authenticate(username=email, password=password)
-            if user is not None:
-                access_token = AccessToken.for_user(user)
-                response_data = {
-                    'success': True,
-                    'status': 200,
-                    'message': 'Signup successful',
-                    'first_name': serializer.data['first_name'],
-                    'last_name': serializer.data['last_name'],
-                    'access_token': str(access_token)
-                }
-                return Response(response_data, status=status.HTTP_201_CREATED)
-            else:
-                response_data = {
-                    'success': False,
-                    'status': 401,
-                    'message': 'Invalid credentials',
-                }
-                return Response(response_data, status=status.HTTP_401_UNAUTHORIZED)
+            with transaction.atomic():
+                # The password is hashed once here; the new user needs no authenticate() round
+                user = serializer.save()
+                refresh_token = UserRefreshToken.for_user(user)
+                email_subject = 'Welcome to ELBIS Homes'
+                email_body = f"""Dear {user},\n\nThank you for signing up with ELBIS Homes. You can now save your favorite properties and send enquiries to our agents.\n\nRegards,\nELBIS Homes"""
+                queue_email(email_subject, email_body, [user.email])
+            response_data = {
+                'success': True,
+                'status': 200,
+                'message': 'Signup successful',
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'access_token': str(refresh_token.access_token),
+                'refresh_token': str(refresh_token)
+            }
+            return Response(response_data, status=status.HTTP_201_CREATED)
         except Exception as e:
             general_logger.error("An error occurred: %s", e)
             response_data = {
@@ -149,14 +230,15 @@ class LogInView(viewsets.ViewSet):
             password = serializer.validated_data.get('password')
             user = authenticate(username=email, password=password)
             if user is not None:
-                access_token = AccessToken.for_user(user)
+                refresh_token = UserRefreshToken.for_user(user)
                 response_data = {
                     'success': True,
                     'status': 200,
                     'message': 'Login successful',
                     'first_name': str(user.first_name),
                     'last_name': str(user.last_name),
-                    'access_token': str(access_token)
+                    'access_token': str(refresh_token.access_token),
+                    'refresh_token': str(refresh_token)
                 }
                 return Response(response_data, status=status.HTTP_200_OK)
             else:
@@ -189,10 +271,13 @@ class LogOutView(viewsets.ViewSet):
         try:
             token = request.auth
             if token:
-                cache_key = CustomJWTAuthentication.get_cache_key(self, str(token))
-                # Set timeout as per token expiry
-                timeout = timedelta(hours=3).total_seconds()
-                cache.set(cache_key, 'blacklisted', timeout=timeout)
+                # Revoked for every worker until the token expires
+                revoke_token(token)
+                if request.data.get('refresh_token'):
+                    try:
+                        UserRefreshToken(request.data['refresh_token']).blacklist()
+                    except TokenError:
+                        pass
                 response_data = {
                     'success': True,
                     'status': 205,
@@ -214,6 +299,102 @@ class LogOutView(viewsets.ViewSet):
                 'message': "Validation error occured",
             }
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(responses={205: 'RESET CONTENT', 500: 'SERVER ERROR'})
+    @action(detail=False, methods=['post'], url_path='all')
+    def all(self, request):
+        """
+        Log out of every session by invalidating all of the user's access tokens.
+        """
+        try:
+            revoke_user_sessions(request.user.pk)
+            response_data = {
+                'success': True,
+                'status': 205,
+                'message': 'Logged out of all sessions',
+            }
+            return Response(response_data, status=status.HTTP_205_RESET_CONTENT)
+        except Exception as e:
+            general_logger.error("An error occurred: %s", e)
+            response_data = {
+                'success': False,
+                'status': 500,
+                'message': 'An error occurred while logging out',
+            }
+            return Response(response_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+
+class TokenView(viewsets.ViewSet):
+    """
+    Token Refresh Endpoint
+
+    Exchange a refresh token for a new access and refresh token pair without
+    sending the password again, or revoke a refresh token.
+    """
+    serializer_class = RefreshTokenSerializer
+    permission_classes = [AllowAny]
+    # The refresh token is the credential; an expired access token must not get in the way
+    authentication_classes = []
+
+    @swagger_auto_schema(request_body=RefreshTokenSerializer, responses={200: 'OK', 400: 'BAD REQUEST', 401: 'UNAUTHORIZED'})
+    @action(detail=False, methods=['post'], url_path='refresh')
+    def refresh(self, request):
+        serializer = self.serializer_class(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+            access_token, refresh_token = rotate_refresh_token(serializer.validated_data['refresh_token'])
+            response_data = {
+                'success': True,
+                'status': 200,
+                'message': 'Token refreshed successfully',
+                'access_token': str(access_token),
+                'refresh_token': str(refresh_token)
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+        except TokenError as e:
+            response_data = {
+                'success': False,
+                'status': 401,
+                'message': str(e),
+            }
+            return Response(response_data, status=status.HTTP_401_UNAUTHORIZED)
+        except Exception as e:
+            general_logger.error("An error occurred: %s", e)
+            response_data = {
+                'success': False,
+                'status': 400,
+                'message': 'Validation error: refresh_token field is invalid or empty',
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(request_body=RefreshTokenSerializer, responses={205: 'RESET CONTENT', 400: 'BAD REQUEST', 401: 'UNAUTHORIZED'})
+    @action(detail=False, methods=['post'], url_path='revoke')
+    def revoke(self, request):
+        serializer = self.serializer_class(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+            UserRefreshToken(serializer.validated_data['refresh_token']).blacklist()
+            response_data = {
+                'success': True,
+                'status': 205,
+                'message': 'Token revoked successfully',
+            }
+            return Response(response_data, status=status.HTTP_205_RESET_CONTENT)
+        except TokenError as e:
+            response_data = {
+                'success': False,
+                'status': 401,
+                'message': str(e),
+            }
+            return Response(response_data, status=status.HTTP_401_UNAUTHORIZED)
+        except Exception as e:
+            general_logger.error("An error occurred: %s", e)
+            response_data = {
+                'success': False,
+                'status': 400,
+                'message': 'Validation error: refresh_token field is invalid or empty',
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         
 
 class ResetPasswordView(viewsets.ViewSet):
@@ -232,12 +413,13 @@ class ResetPasswordView(viewsets.ViewSet):
             serializer.is_valid(raise_exception=True)
             email = serializer.validated_data.get('email')
             user = UserModel.objects.get(email=email)
-            token, _ = CustomPasswordResetToken.objects.get_or_create(user=user)
-            email_subject = 'ELBIS Homes: Password Reset Request'
-            email_body = f"""Dear {user},\n\nYou have requested a password reset. Use the following token to reset your password within the next 10 minutes before expiration:\n\nToken: {token.key}\n\nPS: Please ignore if you did not initiate this process.\n\nRegards,\nELBIS Homes"""
-            recipient = [user.email]
-            # Asynchronously handle send mail
-            Thread(target=send_async_email, args=(email_subject, email_body, recipient)).start()
+            with transaction.atomic():
+                otp = issue_otp(user)
+                minutes = settings.PASSWORD_RESET_OTP_TIMEOUT // 60
+                email_subject = 'ELBIS Homes: Password Reset Request'
+                email_body = f"""Dear {user},\n\nYou have requested a password reset. Use the following token to reset your password within the next {minutes} minutes before expiration:\n\nToken: {otp}\n\nPS: Please ignore if you did not initiate this process.\n\nRegards,\nELBIS Homes"""
+                recipient = [user.email]
+                queue_email(email_subject, email_body, recipient)
             response_data = {
                 'success': True,
                 'status': 200,
@@ -269,35 +451,47 @@ class ConfirmPasswordView(viewsets.ViewSet):
     """
     serializer_class = ConfirmPasswordSerializer
     permission_classes = [AllowAny]
+    # Guessing codes is limited per client; naming the account also limits guesses at its code
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'password_reset'
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Throttled):
+            response_data = {
+                'success': False,
+                'status': 429,
+                'message': 'Too many attempts, try again later!',
+            }
+            headers = {'Retry-After': str(math.ceil(exc.wait))} if exc.wait else None
+            return Response(response_data, status=status.HTTP_429_TOO_MANY_REQUESTS, headers=headers)
+        return super().handle_exception(exc)
     
-    @swagger_auto_schema(request_body=ConfirmPasswordSerializer, responses={200: 'OK', 400: 'BAD REQUEST', 406: 'NOT ACCEPTABLE', 500:'SERVER ERROR'})
+    @swagger_auto_schema(request_body=ConfirmPasswordSerializer, responses={200: 'OK', 400: 'BAD REQUEST', 406: 'NOT ACCEPTABLE', 429: 'TOO MANY REQUESTS', 500:'SERVER ERROR'})
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
             otp_token = serializer.validated_data.get('token')
             password = serializer.validated_data.get('password')
-            token = CustomPasswordResetToken.objects.select_related('user').get(key=otp_token)
-            if token.is_expired():
-                token.delete()
-                response_data = {
-                    'success': False,
-                    'status': 406,
-                    'message': 'Token has expired!',
-                }
-                return Response(response_data, status=status.HTTP_406_NOT_ACCEPTABLE)
-            user = token.user
+            user = consume_otp(otp_token, serializer.validated_data.get('email'))
             user.set_password(password)
             user.save()
-            token.delete()
+            # Sessions opened with the old password no longer work
+            revoke_user_sessions(user.pk)
             response_data = {
                 'success': True,
                 'status': 200,
                 'message': 'Password has been reset successfully.',
             }
             return Response(response_data, status=status.HTTP_200_OK)
-        except CustomPasswordResetToken.DoesNotExist as e:
-            general_logger.error("Token error occurred: %s", e)
+        except ExpiredOTP:
+            response_data = {
+                'success': False,
+                'status': 406,
+                'message': 'Token has expired!',
+            }
+            return Response(response_data, status=status.HTTP_406_NOT_ACCEPTABLE)
+        except InvalidOTP:
             response_data = {
                 'success': False,
                 'status': 400,
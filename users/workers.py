@@ -0,0 +1,10 @@
+"""
+Process pool entry points. Spawned workers import this module before Django
+is set up, so it must not import models.
+"""
+import django
+
+
+def setup_worker():
+    # A spawned worker starts a fresh interpreter; it only hashes and never opens a connection
+    django.setup()
@@ -1,11 +1,35 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import AuthenticationFailed
-from django.core.mail import EmailMultiAlternatives
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, UntypedToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework.pagination import BasePagination
+from rest_framework import serializers
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import JSONParser
+from django.core.mail import get_connection
+from django.http import StreamingHttpResponse
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q, F
+from django.db import transaction, connection as db_connection
+from django.utils.timezone import now
+from django.utils.functional import cached_property
+from datetime import datetime, timedelta, timezone
+from users.models import UserModel, EmailOutbox, RevokedToken, RotatedRefreshToken
 from django.core.cache import cache
 from django.conf import settings
-import hashlib, logging
+import hashlib, logging, json, base64, threading, queue, atexit, math, time, io
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 """
@@ -36,41 +60,838 @@ class UserModelManager(BaseUserManager):
     
 
 """
-Custom JWT Authentication where access token is checked for blackilisting
-before authentication.
+Bloom filter over revoked token ids. It can answer "maybe revoked" for a
+token that is not, but never "not revoked" for one that is, so a negative
+answer needs no lookup at all.
+"""
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def get_positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self.get_positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(item))
+
+
+"""
+Revoked access tokens, shared by every worker through the RevokedToken table.
+
+Each process keeps a Bloom filter of the revoked ids, topped up with new
+revocations every TOKEN_REVOCATION_SYNC_INTERVAL seconds and rebuilt (dropping
+expired ids) every TOKEN_REVOCATION_REBUILD_INTERVAL seconds. Only tokens the
+filter reports as possibly revoked are looked up in the cache and database.
+"""
+class TokenRevocationList:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = None
+        self.built_at = None
+
+    def revoke(self, jti, expires_at):
+        remaining = (expires_at - now()).total_seconds()
+        if remaining <= 0:
+            return
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        cache.set(self.get_cache_key(jti), True, timeout=int(remaining) + 1)
+        self.sync()
+        with self.lock:
+            self.filter.add(jti)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        if cache.get(self.get_cache_key(jti)):
+            return True
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=now()).exists()
+
+    def sync(self):
+        current = now()
+        if self.synced_at and (current - self.synced_at).total_seconds() < settings.TOKEN_REVOCATION_SYNC_INTERVAL:
+            return
+        with self.lock:
+            if self.synced_at and (current - self.synced_at).total_seconds() < settings.TOKEN_REVOCATION_SYNC_INTERVAL:
+                return
+            revoked = RevokedToken.objects.filter(expires_at__gt=current)
+            if self.filter is None or (current - self.built_at).total_seconds() >= settings.TOKEN_REVOCATION_REBUILD_INTERVAL:
+                # Expired tokens are rejected by their signature check, so their rows can go
+                RevokedToken.objects.filter(expires_at__lte=current).delete()
+                # is_revoked() reads without the lock, so swap in the filter only once it is full
+                bloom = BloomFilter(settings.TOKEN_REVOCATION_CAPACITY, settings.TOKEN_REVOCATION_ERROR_RATE)
+                for jti in revoked.values_list('jti', flat=True).iterator():
+                    bloom.add(jti)
+                self.filter = bloom
+                self.built_at = current
+            else:
+                # Overlap the previous sync so rows committed late are not missed
+                revoked = revoked.filter(created_on__gte=self.synced_at - timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_INTERVAL))
+                for jti in revoked.values_list('jti', flat=True).iterator():
+                    self.filter.add(jti)
+            self.synced_at = current
+
+    def reset(self):
+        with self.lock:
+            self.filter = None
+            self.synced_at = None
+
+    def get_cache_key(self, jti):
+        return f'auth:revoked:{jti}'
+
+
+token_revocations = TokenRevocationList()
+
+
+def revoke_token(token):
+    """
+    Revoke a validated access token until it expires.
+    """
+    expires_at = datetime.fromtimestamp(token['exp'], tz=timezone.utc)
+    token_revocations.revoke(token[api_settings.JTI_CLAIM], expires_at)
+
+
+GENERATION_CLAIM = 'gen'
+
+
+def get_generation_cache_key(user_id):
+    return f'auth:generation:{user_id}'
+
+
+def get_token_generation(user_id):
+    """
+    The user's current token generation, or None if the user no longer exists.
+    Cached for TOKEN_GENERATION_CACHE_TIMEOUT seconds, which bounds how long
+    other workers keep accepting old tokens when the cache is not shared.
+    """
+    key = get_generation_cache_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = UserModel.objects.filter(pk=user_id).values_list('token_generation', flat=True).first()
+        if generation is not None:
+            cache.set(key, generation, timeout=settings.TOKEN_GENERATION_CACHE_TIMEOUT)
+    return generation
+
+
+def bump_token_generation(user_id):
+    """
+    Invalidate every access token issued to the user so far with one write.
+    """
+    UserModel.objects.filter(pk=user_id).update(token_generation=F('token_generation') + 1)
+    cache.delete(get_generation_cache_key(user_id))
+    return get_token_generation(user_id)
+
+
+def add_user_claims(token, user):
+    token[GENERATION_CLAIM] = user.token_generation
+    token['email'] = user.email
+    token['first_name'] = user.first_name
+    token['last_name'] = user.last_name
+    token['is_staff'] = user.is_staff
+    return token
+
+
+"""
+Access token carrying the user's token generation, so all of a user's
+sessions can be invalidated at once by bumping it, and the profile claims
+ClaimsUser is built from.
+"""
+class UserAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+"""
+Refresh token with the same claims, which it copies into the access tokens
+it issues. It is recorded as outstanding so it can be blacklisted.
+"""
+class UserRefreshToken(RefreshToken):
+    access_token_class = UserAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+def rotate_refresh_token(raw_token):
+    """
+    Exchange a refresh token for a new (access, refresh) pair and blacklist it.
+    Presenting a refresh token that was already rotated means it leaked, so
+    every session of its user is revoked.
+    """
+    try:
+        refresh = UserRefreshToken(raw_token)
+    except TokenError:
+        detect_refresh_reuse(raw_token)
+        raise
+
+    user = UserModel.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+    if user is None or not user.is_active or refresh.get(GENERATION_CLAIM, 0) != user.token_generation:
+        raise TokenError("Token is invalid or expired")
+
+    # Only one request can blacklist the token, so a concurrent second use also counts as reuse
+    blacklisted, created = refresh.blacklist()
+    if not created:
+        revoke_user_sessions(user.pk)
+        raise TokenError("Refresh token has already been used")
+    RotatedRefreshToken.objects.create(token_id=blacklisted.token_id)
+
+    refresh = UserRefreshToken.for_user(user)
+    return refresh.access_token, refresh
+
+
+def detect_refresh_reuse(raw_token):
+    try:
+        token = UntypedToken(raw_token)
+    except TokenError:
+        # Forged or expired: nothing to act on
+        return
+    if token.get(api_settings.TOKEN_TYPE_CLAIM) != 'refresh':
+        return
+    # Tokens blacklisted by a logout or password reset are just rejected
+    if RotatedRefreshToken.objects.filter(token__jti=token[api_settings.JTI_CLAIM]).exists():
+        revoke_user_sessions(token[api_settings.USER_ID_CLAIM])
+        raise TokenError("Refresh token has already been used")
+
+
+def revoke_user_sessions(user_id):
+    """
+    Blacklist all of the user's outstanding refresh tokens and invalidate
+    their access tokens.
+    """
+    outstanding = OutstandingToken.objects.filter(user_id=user_id, expires_at__gt=now(), blacklistedtoken__isnull=True)
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id in outstanding.values_list('id', flat=True)],
+        ignore_conflicts=True,
+    )
+    bump_token_generation(user_id)
+
+
+"""
+Short-lived per-process cache of full user rows for the requests that need
+more than the token claims.
+"""
+class UserCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+
+    def get(self, user_id):
+        key = str(user_id)
+        current = time.monotonic()
+        with self.lock:
+            entry = self.users.get(key)
+            if entry and entry[0] > current:
+                return entry[1]
+        user = UserModel.objects.filter(pk=user_id).first()
+        with self.lock:
+            if len(self.users) >= settings.USER_CACHE_SIZE:
+                # Dicts keep insertion order, so this drops the oldest entry
+                self.users.pop(next(iter(self.users)))
+            self.users[key] = (current + settings.USER_CACHE_TIMEOUT, user)
+        return user
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+"""
+Stateless user rebuilt from the signed token claims, so authenticating a
+request needs no user query. get_instance() loads the full row through the
+per-process user cache for the few places that need it.
+"""
+class ClaimsUser(TokenUser):
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def first_name(self):
+        return self.token.get('first_name', '')
+
+    @cached_property
+    def last_name(self):
+        return self.token.get('last_name', '')
+
+    @cached_property
+    def token_generation(self):
+        return self.token.get(GENERATION_CLAIM, 0)
+
+    def get_username(self):
+        return self.email
+
+    def get_instance(self):
+        return user_cache.get(self.pk)
+
+
+"""
+Custom JWT Authentication where access token is checked for revocation
+and for a stale token generation before authentication.
 """
 class CustomJWTAuthentication(JWTAuthentication):
     def get_validated_token(self, raw_token):
         # Validate the token using the default mechanism
         validated_token = super().get_validated_token(raw_token)
-        
-        # Create a cache key using the token's string representation
-        cache_key = self.get_cache_key(str(validated_token))
-        
-        # Check if the token is blacklisted in the cache
-        if cache.get(cache_key) == 'blacklisted':
+
+        if token_revocations.is_revoked(validated_token[api_settings.JTI_CLAIM]):
             raise AuthenticationFailed("This token has been blacklisted.")
 
+        # Tokens issued before generations existed carry none and count as 0
+        generation = get_token_generation(validated_token[api_settings.USER_ID_CLAIM])
+        if validated_token.get(GENERATION_CLAIM, 0) != generation:
+            raise AuthenticationFailed("This token has been revoked.")
+
         return validated_token
 
-    def get_cache_key(self, token_str):
+    def get_user(self, validated_token):
+        # Deactivation bumps the token generation, so a token that got this far belongs to an active user
+        if settings.JWT_STATELESS_USER and 'email' in validated_token:
+            return ClaimsUser(validated_token)
+
+        # The full row, e.g. for tokens issued before the profile claims existed
+        user = user_cache.get(validated_token[api_settings.USER_ID_CLAIM])
+        if user is None:
+            raise AuthenticationFailed("User not found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive")
+        return user
+
+
+"""
+Keyset (cursor) pagination where each page is located with a WHERE clause on
+the ordering columns instead of an OFFSET, so page N costs the same as page 1.
+The primary key is always appended to the ordering as a tiebreaker.
+"""
+class KeysetPagination(BasePagination):
+    ordering = ('-pk',)
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    # Only paginate when the client asks for it with a cursor or page size
+    opt_in = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = self.decode_cursor(request)
+        if self.opt_in and self.cursor is None and self.page_size_query_param not in request.query_params:
+            return None
+
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        reverse = self.cursor is not None and self.cursor['reverse']
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        self.position_fields = [field.lstrip('-') for field in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_position_filter(queryset.model, ordering, self.cursor['position']))
+
+        # Fetch one extra row to know whether there is a further page
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_cursor = None
+        self.previous_cursor = None
+        if results:
+            if has_more or reverse:
+                self.next_cursor = self.encode_cursor(results[-1], reverse=False)
+            if (has_more and reverse) or (self.cursor is not None and not reverse):
+                self.previous_cursor = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            raise ValidationError('Page size must be a number')
+        if page_size < 1:
+            raise ValidationError('Page size must be greater than zero')
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
         """
-        Generates a cache key based on the token string by hashing the token.
-        You can also include additional logic to create a unique key.
+        Use the queryset's explicit ordering, then the model's default ordering,
+        and make sure the primary key is the last column so every position is unique.
         """
-        return hashlib.sha256(token_str.encode()).hexdigest()
-    
+        opts = queryset.model._meta
+        ordering = list(queryset.query.order_by) or list(opts.ordering) or list(self.ordering)
+        ordering = [f'-{opts.pk.name}' if field == '-pk' else opts.pk.name if field == 'pk' else field for field in ordering]
+        if opts.pk.name not in [field.lstrip('-') for field in ordering]:
+            direction = '-' if ordering and ordering[-1].startswith('-') else ''
+            ordering.append(f'{direction}{opts.pk.name}')
+        return ordering
+
+    def get_position_filter(self, model, ordering, position):
+        """
+        Build `(a < x) OR (a = x AND b < y) OR ...` for the ordering columns.
+        """
+        if len(position) != len(ordering):
+            raise ValidationError(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            value = self.to_python(model, name, value)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def to_python(self, model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as a relevance score are stored as plain JSON values
+            return value
+        except (DjangoValidationError, TypeError, ValueError):
+            raise ValidationError(self.invalid_cursor_message)
+
+    def get_position(self, item):
+        position = []
+        for name in self.position_fields:
+            value = item[name] if isinstance(item, dict) else getattr(item, name)
+            position.append(value if value is None or isinstance(value, (int, float)) else str(value))
+        return position
+
+    def encode_cursor(self, item, reverse):
+        payload = json.dumps({'p': self.get_position(item), 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            position, reverse = payload['p'], payload['r']
+        except (TypeError, ValueError, KeyError):
+            raise ValidationError(self.invalid_cursor_message)
+        # Positions are written by get_position: a list of strings and numbers
+        if not isinstance(position, list) or not isinstance(reverse, bool):
+            raise ValidationError(self.invalid_cursor_message)
+        if any(isinstance(value, bool) or not isinstance(value, (str, int, float)) for value in position):
+            raise ValidationError(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
+
+    def get_cursors(self):
+        return {'next': self.next_cursor, 'previous': self.previous_cursor}
+
+    def get_paginated_response(self, data):
+        return Response({**self.get_cursors(), 'data': data})
+
+
+"""
+Read-only fast path for list endpoints.
+
+FastSerializer compiles a DRF serializer into the values() columns it reads
+and one converter per field, then serializes plain row dicts. The output is
+identical to serializer(many=True).data, without model instances, attribute
+lookups or OrderedDicts per row. compile_serializer() returns None for
+serializers with fields it cannot map to columns, so callers can fall back
+to DRF.
+"""
+class RowObject:
+    # Stands in for a model instance when calling SerializerMethodFields
+    __slots__ = ('row', 'prefix')
+
+    def __init__(self, row, prefix):
+        self.row = row
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        try:
+            return self.row[self.prefix + name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FastSerializer:
+    VALUE, METHOD, NESTED = range(3)
+
+    def __init__(self, serializer, prefix=''):
+        self.prefix = prefix
+        self.columns = []
+        self.steps = []
+        model = serializer.Meta.model
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.steps.append((name, self.METHOD, getattr(serializer, field.method_name), None))
+            elif isinstance(field, serializers.BaseSerializer):
+                if isinstance(field, serializers.ListSerializer) or '.' in field.source:
+                    raise ValueError(f"Cannot compile field {name}")
+                child = FastSerializer(field, prefix=f'{prefix}{field.source}__')
+                # The related pk tells a missing relation apart, even when no field selects it
+                pk_column = f'{prefix}{field.source}__{model._meta.get_field(field.source).related_model._meta.pk.name}'
+                self.columns += [*child.columns, pk_column]
+                self.steps.append((name, self.NESTED, child, pk_column))
+            else:
+                if '.' in field.source or field.source == '*' or isinstance(field, serializers.RelatedField):
+                    raise ValueError(f"Cannot compile field {name}")
+                column = prefix + field.source
+                self.columns.append(column)
+                self.steps.append((name, self.VALUE, get_converter(field, model), column))
+
+    def get_values(self, queryset, *extra):
+        """
+        The queryset as row dicts with every column, annotation and extra
+        field (e.g. the pagination ordering) the rows need.
+        """
+        names = dict.fromkeys([*self.columns, *queryset.query.annotations, *extra])
+        return queryset.values(*names)
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def to_representation(self, row):
+        data = {}
+        for name, kind, convert, column in self.steps:
+            if kind == self.VALUE:
+                value = row[column]
+                data[name] = None if value is None else convert(value)
+            elif kind == self.METHOD:
+                data[name] = convert(RowObject(row, self.prefix))
+            else:
+                data[name] = None if row[column] is None else convert.to_representation(row)
+        return data
+
+
+def get_converter(field, model):
+    """
+    A function of the raw column value that matches field.to_representation().
+    """
+    if isinstance(field, serializers.FileField):
+        storage = model._meta.get_field(field.source).storage
+        request = field.context.get('request')
+        use_url = getattr(field, 'use_url', drf_settings.UPLOADED_FILES_USE_URL)
+
+        def convert_file(name):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert_file
+    if isinstance(field, serializers.ChoiceField):
+        return field.to_representation
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, serializers.IntegerField):
+        return int
+    return field.to_representation
+
+
+def compile_serializer(serializer):
+    try:
+        return FastSerializer(serializer)
+    except (ValueError, FieldDoesNotExist):
+        return None
+
+
+"""
+Streamed list responses.
+
+stream_list() renders the usual envelope with its `data` list written a
+chunk of rows at a time, so memory per request does not grow with the
+table. Rows are read in keyset order, STREAM_CHUNK_SIZE per query: the
+MySQL driver buffers a whole result set even under QuerySet.iterator(),
+while each keyset query only ever holds one chunk.
+"""
+STREAM_VALUES = {'true': True, '1': True}
+
+
+def wants_stream(request):
+    return STREAM_VALUES.get(request.query_params.get('stream', '').lower(), False)
+
+
+def iterate_keyset(queryset, chunk_size):
+    paginator = KeysetPagination()
+    ordering = paginator.get_ordering(queryset)
+    paginator.position_fields = [field.lstrip('-') for field in ordering]
+    queryset = queryset.order_by(*ordering)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = paginator.get_position(chunk[-1])
+        chunk = list(queryset.filter(paginator.get_position_filter(queryset.model, ordering, position))[:chunk_size])
+
+
+def render_envelope(envelope, chunks, serialize):
+    renderer = drf_settings.DEFAULT_RENDERER_CLASSES[0]()
+    # The envelope with an empty data list, split where the rows go
+    head = renderer.render({**envelope, 'data': []})
+    yield head[:-len(b']}')]
+    separator = b''
+    try:
+        for chunk in chunks:
+            yield separator + renderer.render([serialize(row) for row in chunk])[1:-1]
+            separator = b','
+    except Exception as e:
+        # The status line is already sent; end with a truncated body the client cannot parse
+        general_logger.error("An error occurred while streaming a response: %s", e)
+        return
+    yield b']}'
+
+
+def stream_list(queryset, serializer, envelope):
+    """
+    A StreamingHttpResponse of `envelope` with every row of `queryset` as its
+    data. `serializer` is an unbound serializer carrying the context.
+    """
+    fast = compile_serializer(serializer)
+    if fast is not None:
+        ordering = [field.lstrip('-') for field in KeysetPagination().get_ordering(queryset)]
+        queryset = fast.get_values(queryset, *ordering)
+        serialize = fast.to_representation
+    else:
+        serialize = lambda instance: type(serializer)(instance, context=serializer.context).data
+    chunks = iterate_keyset(queryset, settings.STREAM_CHUNK_SIZE)
+    return StreamingHttpResponse(render_envelope(envelope, chunks, serialize), status=envelope['status'], content_type='application/json')
+
+
+"""
+JSON renderer and parser backed by orjson, falling back to DRF's stdlib
+implementation when orjson is not installed.
+
+The output is byte for byte what JSONRenderer writes: compact separators,
+unescaped UTF-8, Z for UTC datetimes and escaped U+2028/U+2029. UUIDs,
+dates and datetimes are encoded natively; anything else goes through DRF's
+encoder. Values orjson rejects (integers beyond 64 bits, lone surrogates)
+and indented output are rendered by JSONRenderer itself. Two differences
+remain: floats of 1e16 and above or below 1e-4 are written without the `+`
+and leading zeros in the exponent (1e16 rather than 1e+16), and NaN or
+Infinity becomes null instead of raising.
+"""
+class FastJSONRenderer(JSONRenderer):
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        body = stream.read()
+        try:
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (orjson.JSONDecodeError, UnicodeDecodeError, LookupError):
+            # Let the stdlib parser accept what it can and word the error
+            stream = io.BytesIO(body.encode(encoding) if isinstance(body, str) else body)
+            return super().parse(stream, media_type, parser_context)
+
 
 # Get the email and general error logger
 email_logger = logging.getLogger('email_logger')
 general_logger = logging.getLogger('general_logger')
 
 
-# Asynchronous email sending
-def send_async_email(email_subject, email_body, email_recipient, email_headers=None):
-    try:
-        email_sender = settings.DEFAULT_FROM_EMAIL
-        email = EmailMultiAlternatives(email_subject, email_body, email_sender, email_recipient, headers=email_headers)
-        email.send()
-    except Exception as e:
-        email_logger.error(f"Error sending email: {e}")
+"""
+Process-wide bounded pool of email workers.
+
+Messages wait in a bounded queue instead of each getting its own thread. When
+the queue is full, submit() gives up after EMAIL_QUEUE_TIMEOUT seconds rather
+than piling up work. Each worker sends whatever is queued, up to
+EMAIL_BATCH_SIZE messages, over a single SMTP connection. Queued messages are
+drained on interpreter shutdown.
+"""
+class EmailDispatcher:
+    def __init__(self):
+        self.queue = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.metrics = {'queued': 0, 'sent': 0, 'failed': 0, 'rejected': 0, 'batches': 0}
+
+    def start(self):
+        # Workers are started on first use so management commands never spawn them
+        with self.lock:
+            if self.threads:
+                return
+            self.queue = queue.Queue(maxsize=settings.EMAIL_QUEUE_SIZE)
+            for index in range(settings.EMAIL_WORKERS):
+                thread = threading.Thread(target=self.work, name=f'email-worker-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            atexit.register(self.shutdown)
+
+    def submit(self, message):
+        """
+        Queue an EmailMessage; returns False when the queue stays full (backpressure).
+        """
+        self.start()
+        try:
+            self.queue.put(message, timeout=settings.EMAIL_QUEUE_TIMEOUT)
+        except queue.Full:
+            self.increment('rejected')
+            email_logger.error(f"Email queue is full, dropping email to {message.to}")
+            return False
+        self.increment('queued')
+        return True
+
+    def work(self):
+        stopping = False
+        while not stopping:
+            message = self.queue.get()
+            if message is None:
+                break
+            batch = [message]
+            while len(batch) < settings.EMAIL_BATCH_SIZE:
+                try:
+                    message = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    stopping = True
+                    break
+                batch.append(message)
+            self.send_batch(batch)
+            # Worker threads hold their own database connection
+            db_connection.close()
+
+    def send_batch(self, batch):
+        """
+        Send the batch over one connection, marking each email sent as soon as
+        it goes out so a failure part way never resends the earlier ones.
+        """
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            # Outbox rows stay pending and are retried by process_email_outbox
+            self.increment('failed', len(batch))
+            email_logger.error(f"Error opening email connection: {e}")
+        else:
+            for message in batch:
+                if not self.claim(message):
+                    continue
+                try:
+                    sent = connection.send_messages([message]) or 0
+                except Exception as e:
+                    sent = 0
+                    email_logger.error(f"Error sending email: {e}")
+                if sent:
+                    self.increment('sent')
+                else:
+                    self.increment('failed')
+                self.release(message, sent)
+            connection.close()
+        self.increment('batches')
+
+    def claim(self, message):
+        # The outbox command may be sending the email already, after its grace period
+        outbox_id = getattr(message, 'outbox_id', None)
+        if outbox_id is None:
+            return True
+        try:
+            return EmailOutbox.claim(outbox_id)
+        except Exception as e:
+            # Left for process_email_outbox
+            email_logger.error(f"Error claiming outbox email: {e}")
+            return False
+
+    def release(self, message, sent):
+        """
+        Record the outcome on the email's outbox row; an unsent one becomes
+        claimable again, for process_email_outbox to retry.
+        """
+        outbox_id = getattr(message, 'outbox_id', None)
+        if outbox_id is None:
+            return
+        try:
+            update = {'status': EmailOutbox.SENT, 'sent_on': now()} if sent else {}
+            EmailOutbox.objects.filter(pk=outbox_id).update(claimed_at=None, **update)
+        except Exception as e:
+            email_logger.error(f"Error updating outbox email: {e}")
+
+    def increment(self, metric, amount=1):
+        with self.lock:
+            self.metrics[metric] += amount
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics['queue_depth'] = self.queue.qsize() if self.queue else 0
+        metrics['workers'] = len(self.threads)
+        return metrics
+
+    def shutdown(self, timeout=None):
+        """
+        Let the workers finish everything already queued, then stop them.
+        """
+        if not self.threads:
+            return
+        timeout = settings.EMAIL_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+        general_logger.info("Email dispatcher stopped: %s", self.get_metrics())
+        self.threads = []
+
+
+email_dispatcher = EmailDispatcher()
+
+
+def queue_email(email_subject, email_body, email_recipient, email_headers=None):
+    """
+    Write an email into the durable outbox. Call inside the request transaction:
+    once it commits, the worker pool sends the email straight away, and
+    process_email_outbox picks it up after EMAIL_OUTBOX_GRACE seconds if that
+    does not happen (e.g. the worker restarted).
+    """
+    outbox = EmailOutbox.objects.create(
+        subject=email_subject,
+        body=email_body,
+        recipients=list(email_recipient),
+        headers=email_headers or {},
+        next_attempt_at=now() + timedelta(seconds=settings.EMAIL_OUTBOX_GRACE),
+    )
+    transaction.on_commit(lambda: email_dispatcher.submit(outbox.to_message()))
+    return outbox
+